@@ -0,0 +1,44 @@
+import random
+
+# Synthetic data which passes the API's validation, shared by the seeder and the
+# load driver so that the driver can log in as the seeded users
+
+password = "benchmark"
+
+first_names = [
+    "Ada", "Alan", "Alice", "Anna", "Ben", "Carl", "Clara", "Dan", "Dora", "Eli",
+    "Emma", "Finn", "Grace", "Hugo", "Ida", "Ivan", "Jack", "Jane", "Karl", "Lea",
+    "Leo", "Lily", "Marc", "Maya", "Nora", "Omar", "Paul", "Rosa", "Sam", "Tara",
+]
+last_names = [
+    "Adams", "Baker", "Brown", "Clark", "Davis", "Evans", "Fisher", "Garcia",
+    "Green", "Hall", "Harris", "Hill", "Jones", "King", "Lee", "Lopez", "Martin",
+    "Miller", "Moore", "Nelson", "O'Brien", "Parker", "Smith", "Taylor", "Turner",
+    "Walker", "White", "Wilson", "Wright", "Young",
+]
+
+
+def user_email(number: int):
+    return f"bench{number}@example.com"
+
+
+def display_name(number: int):
+    return f"bench{number}"
+
+
+def phone(number: int):
+    """A phone number unique for every number below a billion"""
+    return (
+        f"+1-{number // 1_000_000 % 1000:03d}-"
+        f"{number // 1000 % 1000:03d}-{number % 1000:03d}"
+    )
+
+
+def contact(number: int, rng: random.Random):
+    """Fields of a ContactCreateRequest, the email and phone are unique per number"""
+    return {
+        "first_name": rng.choice(first_names),
+        "last_name": rng.choice(last_names),
+        "phone": phone(number),
+        "email": f"contact{number}@example.com",
+    }
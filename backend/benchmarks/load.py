@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from typing import Optional
+import httpx
+from benchmarks import dataset
+
+prefix = "/api/v1"
+
+# Relative weights of the scenarios, overridable with --mix
+default_mix = {"login": 1, "list": 10, "create": 3, "edit": 3, "bulk_delete": 1}
+list_sorts = ["id", "first_name", "last_name", "email"]
+
+
+class Recorder:
+    """Latencies and status codes per route, the route is its path template"""
+
+    def __init__(self):
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.statuses: defaultdict[str, Counter] = defaultdict(Counter)
+
+    def record(self, route: str, latency: float, status_code: int):
+        self.latencies[route].append(latency)
+        self.statuses[route][status_code] += 1
+
+    def report(self, duration: float):
+        routes = {
+            route: summarize(latencies, duration)
+            | {"statuses": dict(sorted(self.statuses[route].items()))}
+            for route, latencies in sorted(self.latencies.items())
+        }
+        every = [latency for route in self.latencies.values() for latency in route]
+        return {"routes": routes, "total": summarize(every, duration)}
+
+
+def summarize(latencies: list[float], duration: float):
+    if not latencies:
+        return {"requests": 0}
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    else:
+        percentiles = latencies * 99
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / duration, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+class VirtualUser:
+    """Runs the scenarios as one seeded user. Every virtual user needs a user of
+    its own, since a login replaces the user's tokens."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        recorder: Recorder,
+        number: int,
+        rng: random.Random,
+    ):
+        self.client = client
+        self.recorder = recorder
+        self.number = number
+        self.rng = rng
+        self.headers = {}
+        self.created_ids: list[int] = []
+        # Numbers of the contacts this run creates, far above the seeded ones
+        self.next_contact = rng.randrange(10**8, 9 * 10**8)
+
+    async def request(
+        self, method: str, route: str, path: Optional[str] = None, **kwargs
+    ):
+        """Sends the request to path, which defaults to the route"""
+        start = time.perf_counter()
+        response = await self.client.request(
+            method, f"{prefix}{path or route}", headers=self.headers, **kwargs
+        )
+        self.recorder.record(
+            f"{method} {route}", time.perf_counter() - start, response.status_code
+        )
+        return response
+
+    async def login(self):
+        response = await self.request(
+            "POST",
+            "/users/login",
+            data={
+                "username": dataset.user_email(self.number),
+                "password": dataset.password,
+            },
+        )
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def list(self):
+        params = {
+            "sort_field": self.rng.choice(list_sorts),
+            "sort_order": self.rng.choice(["asc", "desc"]),
+            "page": self.rng.randrange(5),
+            "page_size": 20,
+        }
+        match self.rng.randrange(3):
+            case 0:
+                params |= {
+                    "filter_field": "last_name",
+                    "filter_operator": "starts_with",
+                    "filter_values": [self.rng.choice(dataset.last_names)[:2]],
+                }
+            case 1:
+                params |= {
+                    "filter_field": "first_name",
+                    "filter_operator": "contains",
+                    "filter_values": [self.rng.choice(dataset.first_names)[1:4]],
+                }
+        await self.request("GET", "/contacts", params=params)
+
+    async def create(self):
+        contact = dataset.contact(self.next_contact, self.rng)
+        self.next_contact += 1
+        response = await self.request("POST", "/contacts", json=contact)
+        if response.status_code == 200:
+            self.created_ids.append(response.json()["id"])
+
+    async def edit(self):
+        if not self.created_ids:
+            return await self.create()
+        await self.request(
+            "PATCH",
+            "/contacts/{id}",
+            f"/contacts/{self.rng.choice(self.created_ids)}",
+            json={"first_name": self.rng.choice(dataset.first_names)},
+        )
+
+    async def bulk_delete(self):
+        if len(self.created_ids) < 2:
+            return await self.create()
+        self.rng.shuffle(self.created_ids)
+        count = self.rng.randrange(1, len(self.created_ids))
+        ids, self.created_ids = self.created_ids[:count], self.created_ids[count:]
+        await self.request("DELETE", "/contacts", params={"ids": ids})
+
+    async def run(self, mix: dict[str, int], deadline: float):
+        await self.login()
+        scenarios, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(scenarios, weights)[0]
+            await getattr(self, scenario)()
+
+
+@contextlib.asynccontextmanager
+async def open_client(url: Optional[str]):
+    """Over HTTP when a url is given, otherwise in-process through ASGI"""
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            yield client
+        return
+
+    from src import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://localhost",
+            timeout=60,
+        ) as client:
+            yield client
+
+
+def git_commit():
+    """The commit being measured, so that reports can be compared across commits"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(
+    url: Optional[str], users: int, duration: float, mix: dict[str, int], seed: int
+):
+    recorder = Recorder()
+    async with open_client(url) as client:
+        virtual_users = [
+            VirtualUser(client, recorder, number, random.Random(seed + number))
+            for number in range(users)
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(user.run(mix, deadline=start + duration) for user in virtual_users)
+        )
+        elapsed = time.perf_counter() - start
+    return {
+        "commit": git_commit(),
+        "target": url or "in-process",
+        "users": users,
+        "duration_seconds": round(elapsed, 3),
+        "mix": mix,
+    } | recorder.report(elapsed)
+
+
+def parse_mix(value: str):
+    """Parses e.g. list=10,login=0 into weights, the scenarios left out keep theirs"""
+    mix = dict(default_mix)
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in default_mix:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name}")
+        mix[name] = int(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run mixed scenarios against the address book API and report "
+        "the throughput and latency percentiles of every route as JSON"
+    )
+    parser.add_argument(
+        "--url", help="base URL of a running server, the app runs in-process if omitted"
+    )
+    parser.add_argument(
+        "--users",
+        type=int,
+        default=10,
+        help="concurrent virtual users, each logs in as its own seeded user",
+    )
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=default_mix,
+        help="scenario weights, e.g. list=10,login=0. "
+        f"Scenarios: {', '.join(default_mix)}",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run(
+            url=args.url,
+            users=args.users,
+            duration=args.duration,
+            mix=args.mix,
+            seed=args.seed,
+        )
+    )
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Call every route once and print its SQL statements against "
+        "its budget. The same checks run in tests/test_query_budgets.py. Uses a "
+        "temporary database unless DATABASE_URL is set."
+    )
+    parser.parse_args()
+    if not os.getenv("DATABASE_URL"):
+        directory = tempfile.mkdtemp()
+        os.environ["DATABASE_URL"] = f"sqlite:///{directory}/query_budgets.db"
+
+    # Imported after DATABASE_URL is set, the database is configured on import
+    from fastapi.testclient import TestClient
+    from httpx import Response
+    from src import app
+    from src.db.query_counter import QueryBudgetExceeded, QueryLog
+    from benchmarks.routes import call_routes
+
+    failures = 0
+
+    def report(
+        name: str, budget: int, expected: int, response: Response, log: QueryLog
+    ):
+        nonlocal failures
+        problem = ""
+        if response.status_code != expected:
+            problem = f"status {response.status_code}, expected {expected}"
+        else:
+            try:
+                log.check(budget=budget)
+            except QueryBudgetExceeded as error:
+                problem = str(error)
+        failures += bool(problem)
+        print(f"{'FAIL' if problem else 'ok':4} {name:28} {log.count:3} / {budget}")
+        if problem:
+            print("     " + problem.replace("\n", "\n     "))
+
+    with TestClient(app, base_url="http://localhost") as client:
+        call_routes(client, report)
+
+    print(f"{failures} routes over budget" if failures else "every route is in budget")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import json
+from typing import Callable
+from fastapi.testclient import TestClient
+from httpx import Response
+from src.config import prefix
+from src.db.query_counter import QueryLog, count_queries
+
+# Calls every route once with the statement budget of each call, for checking how
+# many SQL statements it ran and that it repeated no statement shape (a probable
+# N+1). Shared by tests/test_query_budgets.py and benchmarks/query_budgets.py. The
+# steps run in order, later ones use the user and contacts the earlier ones
+# created.
+
+type Report = Callable[[str, int, int, Response, QueryLog], None]
+
+
+def call_routes(client: TestClient, report: Report):
+    """Calls the routes, report gets the name, statement budget, expected status,
+    response and statement log of each call"""
+
+    def check(name: str, budget: int, method: str, path: str, expected=200, **kwargs):
+        with count_queries() as log:
+            response = client.request(method, f"{prefix}{path}", **kwargs)
+        report(name, budget, expected, response, log)
+        return response
+
+    contact = {
+        "first_name": "Ada",
+        "last_name": "Lovelace",
+        "phone": "+1-555-555-000",
+        "email": "ada@example.com",
+    }
+    batch = [
+        contact
+        | {"phone": f"+1-555-555-{number:03d}", "email": f"c{number}@example.com"}
+        for number in range(1, 21)
+    ]
+    user = {
+        "display_name": "budget",
+        "email": "b@example.com",
+        "password": "secret1",
+    }
+    check("register", 1, "POST", "/users/register", json=user)
+    credentials = {"username": user["email"], "password": user["password"]}
+    tokens = check("login", 2, "POST", "/users/login", data=credentials).json()
+    auth = {"Authorization": f"Bearer {tokens['access_token']}"}
+    check("me, cold auth cache", 1, "GET", "/users/me", headers=auth)
+    check("me", 0, "GET", "/users/me", headers=auth)
+
+    created = check("create", 1, "POST", "/contacts", json=contact, headers=auth)
+    contact_id = created.json()["id"]
+    check("create, conflict", 1, "POST", "/contacts", 409, json=contact, headers=auth)
+    results = check(
+        "batch create", 2, "POST", "/contacts/batch", json=batch, headers=auth
+    ).json()["results"]
+    ids = [result["contact"]["id"] for result in results]
+    check("list", 2, "GET", "/contacts", headers=auth)
+    page = check(
+        "list, sorted and filtered",
+        2,
+        "GET",
+        "/contacts",
+        params={
+            "page_size": 5,
+            "sort_field": "last_name",
+            "filter_field": "email",
+            "filter_operator": "contains",
+            "filter_values": ["example"],
+        },
+        headers=auth,
+    ).json()
+    check(
+        "list, next cursor",
+        2,
+        "GET",
+        "/contacts",
+        params={
+            "page_size": 5,
+            "sort_field": "last_name",
+            "cursor": page["next_cursor"],
+        },
+        headers=auth,
+    )
+    tree = {
+        "combinator": "or",
+        "filters": [
+            {"field": "first_name", "operator": "starts_with", "values": ["A"]},
+            {
+                "combinator": "and",
+                "filters": [
+                    {"field": "email", "operator": "contains", "values": ["c1"]},
+                    {"field": "last_name", "operator": "!=", "values": ["Smith"]},
+                ],
+            },
+        ],
+    }
+    check(
+        "list, filter tree",
+        2,
+        "GET",
+        "/contacts",
+        params={"filters": json.dumps(tree)},
+        headers=auth,
+    )
+    check(
+        "list, estimated total",
+        3,
+        "GET",
+        "/contacts",
+        params={
+            "filter_field": "last_name",
+            "filter_operator": "=",
+            "filter_values": ["Lovelace"],
+            "include_total": "estimate",
+        },
+        headers=auth,
+    )
+    check(
+        "list, sparse fields",
+        2,
+        "GET",
+        "/contacts",
+        params={"fields": ["first_name", "last_name"]},
+        headers=auth,
+    )
+    check("get", 2, "GET", f"/contacts/{contact_id}", headers=auth)
+    check("export", 1, "GET", "/contacts/export", headers=auth)
+    check(
+        "edit",
+        1,
+        "PATCH",
+        f"/contacts/{contact_id}",
+        json={"first_name": "Grace"},
+        headers=auth,
+    )
+    edits = [{"id": id, "contact": {"last_name": "Hopper"}} for id in ids[:10]]
+    check("batch edit", 2, "PATCH", "/contacts/batch", json=edits, headers=auth)
+    check(
+        "import",
+        2,
+        "POST",
+        "/contacts/import",
+        files={
+            "file": (
+                "contacts.csv",
+                "first_name,last_name,phone,email\n"
+                "Alan,Turing,+1-555-556-000,alan@example.com\n",
+                "text/csv",
+            )
+        },
+        headers=auth,
+    )
+    check("delete", 1, "DELETE", f"/contacts/{contact_id}", headers=auth)
+    check("delete many", 1, "DELETE", "/contacts", params={"ids": ids}, headers=auth)
+
+    check(
+        "security token",
+        1,
+        "POST",
+        "/users/security-token",
+        json={"password": user["password"]},
+        headers=auth,
+    )
+    # Every write to the user evicts it from the auth cache
+    check(
+        "display name, cold cache",
+        2,
+        "PATCH",
+        "/users/display-name",
+        json={"display_name": "renamed"},
+        headers=auth,
+    )
+    check(
+        "refresh token",
+        1,
+        "GET",
+        "/users/refresh-token",
+        headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+    )
+    relogin = check("login again", 2, "POST", "/users/login", data=credentials)
+    auth = {"Authorization": f"Bearer {relogin.json()['access_token']}"}
+    check("logout", 2, "POST", "/users/logout", 204, headers=auth)
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+from itertools import islice
+import random
+from sqlalchemy import insert, select
+from src.auth import password_manager
+from src.db import migrations
+from src.db.db_models import Contact, User, db
+from benchmarks import dataset
+
+
+async def seed(users: int, contacts: int, chunk_size: int, seed: int):
+    """Creates the missing benchmark users, each with the given number of contacts.
+    Rows are written with multi-row INSERTs, the API isn't involved."""
+    await db.create_all()
+    await migrations.upgrade()
+    rng = random.Random(seed)
+    # Every user has the same password, hashing it once keeps seeding fast
+    hashed_password = password_manager.ph.hash(dataset.password)
+    created = 0
+    async with db.Session() as session:
+        emails = [dataset.user_email(number) for number in range(users)]
+        existing = set(
+            await session.scalars(select(User.email).where(User.email.in_(emails)))
+        )
+        for email, number in zip(emails, range(users)):
+            if email in existing:
+                continue
+            user = User(
+                email=email,
+                display_name=dataset.display_name(number),
+                hashed_password=hashed_password,
+            )
+            session.add(user)
+            await session.flush()
+            rows = (
+                dataset.contact(index, rng) | {"owner_uuid": user.uuid}
+                for index in range(contacts)
+            )
+            while chunk := list(islice(rows, chunk_size)):
+                await session.execute(insert(Contact), chunk)
+            await session.commit()
+            created += 1
+    return created
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Seed the address book database with benchmark users"
+    )
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--contacts", type=int, default=1000, help="per user")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    try:
+        created = await seed(
+            users=args.users,
+            contacts=args.contacts,
+            chunk_size=args.chunk_size,
+            seed=args.seed,
+        )
+        print(
+            f"created {created} users with {args.contacts} contacts each, "
+            f"{args.users - created} already existed"
+        )
+    finally:
+        await db.get_engine().dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
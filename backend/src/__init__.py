@@ -2,6 +2,7 @@ from src.config import fastapi_app, prefix
 from fastapi.middleware import trustedhost, cors
 from src.auth.routes import auth_router
 from src.contacts.routes import contacts_router
+from src.metrics import MetricsMiddleware, metrics_router
 
 app = fastapi_app
 
@@ -19,6 +20,7 @@ fastapi_app.add_middleware(
 fastapi_app.add_middleware(
     trustedhost.TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1"]
 )
+fastapi_app.add_middleware(MetricsMiddleware)
 
 fastapi_app.include_router(
     auth_router, prefix=f"{prefix}/users", tags=["authentication"]
@@ -26,3 +28,4 @@ fastapi_app.include_router(
 fastapi_app.include_router(
     contacts_router, prefix=f"{prefix}/contacts", tags=["contacts"]
 )
+fastapi_app.include_router(metrics_router)
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import time
+from uuid import UUID
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from src import config
+from src.db import db_models
+
+# (uuid, token) -> (expiry, detached copy of the user). Each process has its own
+# cache, so writes in another worker are only seen once the entry expires.
+entries: OrderedDict[tuple[UUID, str], tuple[float, db_models.User]] = OrderedDict()
+keys_by_uuid: dict[UUID, set[tuple[UUID, str]]] = {}
+# Bumped by every invalidate, a user read before the bump may be stale
+generations: dict[UUID, int] = {}
+
+
+def get(uuid: UUID, token: str):
+    """Returns a detached user, attach it with session.merge(user, load=False)"""
+    key = (uuid, token)
+    entry = entries.get(key)
+    if entry is None:
+        return None
+    expiry, user = entry
+    if expiry < time.monotonic():
+        remove(key)
+        return None
+    entries.move_to_end(key)
+    return user
+
+
+def generation(uuid: UUID):
+    """Take it before reading the user from the database, and pass it to put"""
+    return generations.get(uuid, 0)
+
+
+def put(uuid: UUID, token: str, user: db_models.User, read_generation: int):
+    """Caches the user unless it was invalidated since read_generation, so a read
+    which raced a logout can't bring back the revoked token"""
+    if config.auth_cache_max_size <= 0 or generation(uuid) != read_generation:
+        return
+    key = (uuid, token)
+    entries[key] = (time.monotonic() + config.auth_cache_ttl_seconds, copy_user(user))
+    entries.move_to_end(key)
+    keys_by_uuid.setdefault(uuid, set()).add(key)
+    while len(entries) > config.auth_cache_max_size:
+        remove(next(iter(entries)))
+
+
+def invalidate(uuid: UUID):
+    """Drops every cached token of the user, call it after any write to the user"""
+    generations[uuid] = generation(uuid) + 1
+    for key in list(keys_by_uuid.get(uuid, ())):
+        remove(key)
+
+
+def remove(key: tuple[UUID, str]):
+    entries.pop(key, None)
+    keys = keys_by_uuid.get(key[0])
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del keys_by_uuid[key[0]]
+
+
+def copy_user(user: db_models.User):
+    """Copies the loaded columns into a detached instance, which stays usable after
+    the request's session commits and closes"""
+    copy = db_models.User(
+        email=user.email,
+        display_name=user.display_name,
+        hashed_password=user.hashed_password,
+    )
+    for attribute in inspect(db_models.User).column_attrs:
+        setattr(copy, attribute.key, getattr(user, attribute.key))
+    make_transient_to_detached(copy)
+    return copy
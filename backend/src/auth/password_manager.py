@@ -1,13 +1,61 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import time
 from argon2 import PasswordHasher
 from argon2.exceptions import VerificationError
+from src import config, metrics
+from src.exceptions import ServiceBusyException
 
-ph = PasswordHasher()
+ph = PasswordHasher(
+    time_cost=config.argon2_time_cost,
+    memory_cost=config.argon2_memory_cost,
+    parallelism=config.argon2_parallelism,
+)
 
-def is_password_valid(plain_password: str, hashed_password: str):
+executor = ThreadPoolExecutor(
+    max_workers=config.password_hash_workers, thread_name_prefix="argon2"
+)
+max_pending = config.password_hash_workers + config.password_hash_queue_size
+pending = 0
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+async def run_in_pool(operation: str, func, *args, **kwargs):
+    """Runs func on the hashing pool, raises error 503 if the queue is full"""
+    global pending
+    if pending >= max_pending:
+        raise ServiceBusyException
+    pending += 1
+    start = time.perf_counter()
+    try:
+        result, elapsed = await asyncio.get_running_loop().run_in_executor(
+            executor, partial(timed, func, *args, **kwargs)
+        )
+    finally:
+        pending -= 1
+    metrics.password_hash_duration.observe(elapsed, operation=operation)
+    metrics.password_hash_wait.observe(
+        time.perf_counter() - start - elapsed, operation=operation
+    )
+    return result
+
+
+def verify(plain_password: str, hashed_password: str):
     try:
         return ph.verify(hash=hashed_password, password=plain_password)
     except VerificationError:
         return False
 
-def get_password_hash(password: str):
-    return ph.hash(password=password)
+
+async def is_password_valid(plain_password: str, hashed_password: str):
+    return await run_in_pool("verify", verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password: str):
+    return await run_in_pool("hash", ph.hash, password=password)
@@ -9,6 +9,7 @@ from src.exceptions import (
     InactiveUserException,
     IncorrectPasswordException,
     InvalidTokenException,
+    ServiceBusyException,
     UniqueException,
 )
 from src.auth import user_service
@@ -47,6 +48,7 @@ type AllForbidenExceptionModels = InactiveUserException.Model | InvalidTokenExce
     responses={
         403: {"model": InactiveUserException.Model},
         401: {"model": CredentialsException.Model},
+        503: {"model": ServiceBusyException.Model},
     },
 )
 async def login(
@@ -64,6 +66,7 @@ async def login(
     response_model=api_models.UserResponse,
     responses={
         409: {"model": UniqueException.Model},
+        503: {"model": ServiceBusyException.Model},
     },
 )
 async def create_user(
@@ -78,6 +81,7 @@ async def create_user(
     status_code=status.HTTP_204_NO_CONTENT,
     responses={
         403: {"model": AllForbidenExceptionModels},
+        503: {"model": ServiceBusyException.Model},
     },
 )
 async def change_password(
@@ -111,7 +115,10 @@ async def deactivate_user(
 @auth_router.post(
     "/activate",
     status_code=status.HTTP_204_NO_CONTENT,
-    responses={401: {"model": CredentialsException.Model}},
+    responses={
+        401: {"model": CredentialsException.Model},
+        503: {"model": ServiceBusyException.Model},
+    },
 )
 async def activate_user(
     session: Annotated[AsyncSession, Depends(get_session)],
@@ -180,6 +187,7 @@ async def change_display_name(
     responses={
         400: {"model": IncorrectPasswordException.Model},
         403: {"model": AllForbidenExceptionModels},
+        503: {"model": ServiceBusyException.Model},
     },
 )
 async def verify_password(
@@ -63,7 +63,6 @@ class TokenBearer(HTTPBearer):
         credentials = await super().__call__(request=request)
         token = credentials.credentials
         payload = self.decode_token(token=token)    
-        print(payload)
         self.verify_payload(payload=payload)
         return TokenBearerResult(payload=payload, token=token)
         
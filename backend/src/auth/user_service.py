@@ -1,10 +1,10 @@
 from uuid import UUID
 import uuid
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.exc import IntegrityError
 from src.auth import token_manager
-from src.auth import password_manager, api_models
+from src.auth import password_manager, api_models, auth_cache
 from src.exceptions import (
     InactiveUserException,
     IncorrectPasswordException,
@@ -13,7 +13,7 @@ from src.exceptions import (
     unique_exception,
     CredentialsException,
 )
-from src.db import db_models
+from src.db import db_models, writer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
@@ -39,7 +39,7 @@ async def authorize_user(
 ):
     """Authenticats user. raises error 401 if not authorized"""
     user = await get_user_by_email(session, email) if not db_user else db_user
-    if not user or not password_manager.is_password_valid(
+    if not user or not await password_manager.is_password_valid(
         password, user.hashed_password
     ):
         raise CredentialsException
@@ -49,28 +49,47 @@ async def authorize_user(
 
 
 async def create_user(session: AsyncSession, user: api_models.CreateUserRequest):
-    db_user = db_models.User(
-        display_name=user.display_name,
-        email=user.email,
-        hashed_password=password_manager.get_password_hash(password=user.password),
-    )
-    try:
+    hashed_password = await password_manager.get_password_hash(password=user.password)
+
+    async def work(session: AsyncSession):
+        db_user = db_models.User(
+            display_name=user.display_name,
+            email=user.email,
+            hashed_password=hashed_password,
+        )
         session.add(db_user)
-        await session.commit()
-        await session.refresh(db_user)
-        return db_user
-    except IntegrityError as error:
         await session.flush()
+        return api_models.UserResponse.model_validate(db_user, from_attributes=True)
+
+    try:
+        return await writer.write(session, work)
+    except IntegrityError as error:
         raise unique_exception(error=error, instance=user, table_name="users")
 
 
+async def update_user(session: AsyncSession, uuid: UUID, **values):
+    """Writes the values with one UPDATE and drops the user's cached tokens"""
+
+    async def work(session: AsyncSession):
+        await session.execute(
+            update(db_models.User)
+            .where(db_models.User.uuid == uuid)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+    await writer.write(session, work)
+    auth_cache.invalidate(uuid)
+
+
 async def change_password(session: AsyncSession, new_password, db_user: db_models.User):
-    new_hashed_password = password_manager.get_password_hash(new_password)
-    db_user.hashed_password = new_hashed_password
-    db_user.security_token = ""
-    await session.commit()
-    await session.refresh(db_user)
-    return db_user
+    new_hashed_password = await password_manager.get_password_hash(new_password)
+    await update_user(
+        session=session,
+        uuid=db_user.uuid,
+        hashed_password=new_hashed_password,
+        security_token="",
+    )
 
 
 async def change_display_name(
@@ -78,29 +97,32 @@ async def change_display_name(
     request: api_models.ChangeDisplayNameRequest,
     db_user: db_models.User,
 ):
-    db_user.display_name = request.display_name
-    await session.commit()
-    await session.refresh(db_user)
-    return db_user
+    response = api_models.UserResponse(
+        display_name=request.display_name, email=db_user.email, uuid=db_user.uuid
+    )
+    await update_user(
+        session=session, uuid=db_user.uuid, display_name=request.display_name
+    )
+    return response
+
+
+logged_out = dict(is_logged_in=False, refresh_token="", access_token="", security_token="")
 
 
 async def logout_user(session: AsyncSession, db_user: db_models.User):
-    db_user.is_logged_in = False
-    db_user.refresh_token = ""
-    db_user.access_token = ""
-    db_user.security_token = ""
-    await session.commit()
-    await session.refresh(db_user)
+    await update_user(session=session, uuid=db_user.uuid, **logged_out)
 
 
 async def login_user(session: AsyncSession, db_user: db_models.User):
-    db_user.is_logged_in = True
     new_access_token = token_manager.create_token(sub=db_user.uuid.hex, scope="access")
-    db_user.access_token = new_access_token
     new_refresh_token = token_manager.create_token(sub=db_user.uuid.hex, scope="refresh")
-    db_user.refresh_token = new_refresh_token
-    await session.commit()
-    await session.refresh(db_user)
+    await update_user(
+        session=session,
+        uuid=db_user.uuid,
+        is_logged_in=True,
+        access_token=new_access_token,
+        refresh_token=new_refresh_token,
+    )
     return api_models.TokenResponse(
         access_token=new_access_token,
         refresh_token=new_refresh_token,
@@ -108,38 +130,44 @@ async def login_user(session: AsyncSession, db_user: db_models.User):
 
 
 async def deactivate_user(session: AsyncSession, db_user: db_models.User):
-    db_user.disabled = True
-    await logout_user(session=session, db_user=db_user)
+    await update_user(session=session, uuid=db_user.uuid, disabled=True, **logged_out)
 
 
 async def verify_password(
     session: AsyncSession, password: str, db_user: db_models.User
 ):
-    if not password_manager.is_password_valid(password, db_user.hashed_password):
+    if not await password_manager.is_password_valid(password, db_user.hashed_password):
         raise IncorrectPasswordException
     security_token = token_manager.create_token(sub=db_user.uuid.hex, scope="security")
-    db_user.security_token = security_token
-    await session.commit()
-    await session.refresh(db_user)
+    await update_user(session=session, uuid=db_user.uuid, security_token=security_token)
     return api_models.VerifyPasswordResponse(security_token=security_token)
 
 
 async def activate_user(session: AsyncSession, db_user: db_models.User):
-    db_user.disabled = False
-    await session.commit()
-    await session.refresh(db_user)
+    await update_user(session=session, uuid=db_user.uuid, disabled=False)
 
 
 async def refresh_token(session: AsyncSession, refresh_token: str, uuid: UUID):
-    db_user = await get_user_by_uuid(session=session, uuid=uuid)
-    if not db_user or db_user.refresh_token != refresh_token:
+    """Swaps the tokens only if the refresh token is still current, so that of
+    two concurrent refreshes with the same token only one succeeds"""
+    new_access_token = token_manager.create_token(sub=uuid.hex, scope="access")
+    new_refresh_token = token_manager.create_token(sub=uuid.hex, scope="refresh")
+
+    async def work(session: AsyncSession):
+        return await session.scalar(
+            update(db_models.User)
+            .where(
+                db_models.User.uuid == uuid,
+                db_models.User.refresh_token == refresh_token,
+            )
+            .values(access_token=new_access_token, refresh_token=new_refresh_token)
+            .returning(db_models.User.uuid)
+            .execution_options(synchronize_session=False)
+        )
+
+    if await writer.write(session, work) is None:
         raise InvalidTokenException
-    new_access_token = token_manager.create_token(sub=db_user.uuid.hex, scope="access")
-    db_user.access_token = new_access_token
-    new_refresh_token = token_manager.create_token(sub=db_user.uuid.hex, scope="refresh")
-    db_user.refresh_token = new_refresh_token
-    await session.commit()
-    await session.refresh(db_user)
+    auth_cache.invalidate(uuid)
     return api_models.TokenResponse(
         access_token=new_access_token,
         refresh_token=new_refresh_token,
@@ -1,12 +1,66 @@
+import logging
+import os
+import argon2
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import FastAPI
-from src.db.db_models import db
 
 
 async def db_lifespan(_app):
+    # Imported here, the database modules read their settings from this module
+    from src.db.db_models import db, reader_engine
+    from src.db import migrations, writer
+    from src.contacts import search
+
     await db.create_all()
+    try:
+        await migrations.upgrade()
+    except migrations.MigrationError as error:
+        # The message says how to fix the data, a traceback would bury it
+        logging.critical(error)
+        raise SystemExit(1) from None
+    await search.init()
+    writer.start()
     yield
+    await writer.stop()
+    await reader_engine.dispose()
+    await db.get_engine().dispose()
+
+
+# SQLite storage profile, applied to every new connection. In WAL mode readers
+# and the writer don't block each other, and synchronous=normal only syncs the
+# WAL at checkpoints, so a power loss may drop the last commits but can't
+# corrupt the database. Reads use their own pool of query_only connections.
+database_url = os.getenv(
+    "DATABASE_URL", "sqlite:///backend//src//db//instance//addressbook.db"
+)
+sqlite_pragmas = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "wal"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "normal"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+}
+reader_pool_size = int(os.getenv("READER_POOL_SIZE", 4))
+
+# Password hashing runs on a thread pool, argon2 releases the GIL while hashing.
+# Requests beyond the workers and the queue are rejected with 503.
+password_hash_workers = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+password_hash_queue_size = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 64))
+argon2_time_cost = int(os.getenv("ARGON2_TIME_COST", argon2.DEFAULT_TIME_COST))
+argon2_memory_cost = int(os.getenv("ARGON2_MEMORY_COST", argon2.DEFAULT_MEMORY_COST))
+argon2_parallelism = int(os.getenv("ARGON2_PARALLELISM", argon2.DEFAULT_PARALLELISM))
+
+# Authenticated users are cached per (uuid, token), every write to a user evicts it
+auth_cache_ttl_seconds = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 30))
+auth_cache_max_size = int(os.getenv("AUTH_CACHE_MAX_SIZE", 1024))
+
+# Contact imports are validated and committed this many rows at a time
+import_chunk_size = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
 
+# Writes can go through one writer task, which commits the writes waiting for it
+# together (group commit) instead of each request committing on its own
+write_queue_enabled = os.getenv("WRITE_QUEUE_ENABLED", "false").lower() in ("1", "true")
+write_queue_max_batch_size = int(os.getenv("WRITE_QUEUE_MAX_BATCH_SIZE", 64))
 
 version = "v1"
 prefix = f"/api/{version}"
@@ -1,7 +1,8 @@
+import base64
 from copy import deepcopy
 import re
-from typing import Any, Literal, Optional, Type, get_type_hints
-from pydantic import BaseModel, EmailStr, NonNegativeInt, PositiveInt, create_model, field_validator, model_validator
+from typing import Annotated, Any, Literal, Optional, Type, get_type_hints
+from pydantic import BaseModel, EmailStr, Field, NonNegativeInt, PositiveInt, StrictInt, StrictStr, create_model, field_validator, model_validator
 from pydantic.fields import FieldInfo
 
 word_pattern = r"^[A-Za-z]+[-']{0,1}[A-Za-z]+$"
@@ -15,13 +16,14 @@ class ContactCreateRequest(BaseModel):
 
     @model_validator(mode="after")
     def validate_contact(self):
-        assert bool(re.match(word_pattern, self.first_name)), ValueError(
-            "first name must contain only alphabet, ' or - characters."
-        )
-        assert bool(re.match(word_pattern, self.last_name)), ValueError(
-            "last name must contain only alphabet, ' or - characters."
-        )
-        assert bool(re.match(phone_pattern, self.phone)), ValueError(
+        # Fields are None when left out of an UpdateContactRequest
+        assert self.first_name is None or bool(
+            re.match(word_pattern, self.first_name)
+        ), ValueError("first name must contain only alphabet, ' or - characters.")
+        assert self.last_name is None or bool(
+            re.match(word_pattern, self.last_name)
+        ), ValueError("last name must contain only alphabet, ' or - characters.")
+        assert self.phone is None or bool(re.match(phone_pattern, self.phone)), ValueError(
             "phone number must be in this pattern: +###-###-###-###"
         )
         return self
@@ -60,13 +62,16 @@ class ContactResponse(ContactCreateRequest):
         from_attributes = True
 
 
+# Resolved once, every sort, filter and cursor validates its field against it
+allowed_fields = list(get_type_hints(ContactResponse).keys())
+
+
 class ContactField(BaseModel):
     field: str
 
     @field_validator("field")
     @classmethod
     def validate_field(cls, value: str):
-        allowed_fields = list(get_type_hints(ContactResponse).keys())
         if value not in allowed_fields:
             raise ValueError(f"Field must be one of {allowed_fields}")
         return value
@@ -97,19 +102,120 @@ type FilterOperators = Literal[
 
 class Filter(ContactField):
     operator: FilterOperators
-    values: list[str] = [""]
+    values: list[str] = Field(default=[""], min_length=1)
+
+
+max_filter_size = 50
+
+
+class FilterGroup(BaseModel):
+    """Filters and nested groups joined with AND or OR"""
+    combinator: Literal["and", "or"] = "and"
+    filters: list["Filter | FilterGroup"] = Field(min_length=1)
+
+    def size(self) -> int:
+        """Number of filters in the tree"""
+        return sum(
+            item.size() if isinstance(item, FilterGroup) else 1
+            for item in self.filters
+        )
+
+    @model_validator(mode="after")
+    def validate_size(self):
+        if self.size() > max_filter_size:
+            raise ValueError(f"A filter may combine at most {max_filter_size} filters")
+        return self
 
 
 class Pagination(BaseModel):
     page_size: PositiveInt
     page: NonNegativeInt
+    cursor: Optional[str] = None
+
+
+class Cursor(Sort):
+    """Position of the last contact of a page, used for keyset pagination"""
+    # Bound to SQL as is, a crafted cursor mustn't bind anything else
+    value: StrictStr | StrictInt
+    id: int
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).decode()
+
+    @classmethod
+    def decode(cls, cursor: str):
+        return cls.model_validate_json(base64.urlsafe_b64decode(cursor.encode()))
+
+
+type TotalModes = Literal["false", "exact", "estimate"]
 
 
 class ContactsResponse(BaseModel):
     contacts: list[ContactResponse]
-    total: NonNegativeInt
+    total: Optional[NonNegativeInt] = None
+    next_cursor: Optional[str] = None
+
+
+# A contact with only the requested fields, and always the id
+@partial_model
+class SparseContactResponse(ContactResponse):
+    ()
 
 
+class SparseContactsResponse(ContactsResponse):
+    contacts: list[SparseContactResponse]
+
+
+type ExportFormats = Literal["csv", "ndjson"]
+
+
+max_batch_size = 10000
+
+BatchCreateRequest = Annotated[
+    list[ContactCreateRequest], Field(min_length=1, max_length=max_batch_size)
+]
+
+
+class BatchUpdateItem(BaseModel):
+    id: int
+    contact: UpdateContactRequest
+
+
+BatchUpdateRequest = Annotated[
+    list[BatchUpdateItem], Field(min_length=1, max_length=max_batch_size)
+]
+
+
+class BatchResult(BaseModel):
+    index: NonNegativeInt
+    status: Literal["created", "updated", "conflict", "not_found"]
+    contact: Optional[ContactResponse] = None
+    detail: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    results: list[BatchResult]
+    created: NonNegativeInt = 0
+    updated: NonNegativeInt = 0
+
+
+type ImportFormats = Literal["csv", "vcard"]
+
+
+class ImportRowError(BaseModel):
+    row: PositiveInt
+    detail: str
+    # The row couldn't be read, and the rows after it weren't imported
+    fatal: bool = False
+
+
+class ImportResponse(BaseModel):
+    rows: NonNegativeInt = 0
+    created: NonNegativeInt = 0
+    failed: NonNegativeInt = 0
+    errors: list[ImportRowError] = []
+
 
 class DeleteResponse(BaseModel):
-    contacts: list[ContactResponse]
\ No newline at end of file
+    contacts: list[ContactResponse]
+    missing_ids: list[int] = []
\ No newline at end of file
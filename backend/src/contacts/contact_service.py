@@ -1,10 +1,45 @@
-from typing import Optional
-from sqlalchemy import Column, and_, or_, select
-from src.exceptions import UniqueException, NotFoundException
+import csv
+from collections import defaultdict
+from functools import lru_cache
+import io
+from itertools import count, islice
+import json
+from typing import IO, Callable, Iterator, Literal, Optional, Sequence
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import (
+    BindParameter,
+    Column,
+    and_,
+    bindparam,
+    case,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from src.exceptions import (
+    InvalidCursorException,
+    NotFoundException,
+    UniqueException,
+    unique_exception,
+)
 import src.db.db_models as db_models
 import src.contacts.api_models as api_models
+from src.contacts import parsers, search
+from src.db import writer
+from src import config
 from sqlalchemy.ext.asyncio import AsyncSession
 
+contact_fields = list(api_models.ContactResponse.model_fields)
+contact_columns = [getattr(db_models.Contact, field) for field in contact_fields]
+
 
 async def get_contact_by_id(
     session: AsyncSession, contact_id: int, user: db_models.User
@@ -19,36 +54,376 @@ async def get_contact_by_id(
     return contact
 
 
+async def get_data_version(session: AsyncSession, user: db_models.User) -> int:
+    """Version of the user's contacts, triggers on the contacts table increment it
+    on every write"""
+    return await session.scalar(
+        select(db_models.User.data_version).where(db_models.User.uuid == user.uuid)
+    )
+
+
 async def get_contacts(
     session: AsyncSession,
-    filter: api_models.Filter,
+    filter: api_models.Filter | api_models.FilterGroup,
     pagination: api_models.Pagination,
     sort: api_models.Sort,
     user: db_models.User,
+    fields: Optional[Sequence[str]] = None,
+    include_total: api_models.TotalModes = "exact",
 ):
-    selection = (
-        select(db_models.Contact)
-        .where(db_models.Contact.owner_uuid == user.uuid)
-        .where(get_filter(filter))
-        .order_by(get_sort(sort))
-    )
-    result = (await session.scalars(selection)).all()
-    total = len(result)
+    """A page of the user's contacts. When fields is given, only those fields and
+    the id are selected and returned. Without a filter the total is the user's
+    contact_count, which the contacts triggers keep. A filtered total is counted
+    when exact, sampled when estimate, and left out when false."""
+    values = []
+    shape = get_filter_shape(filter, values)
+    params = {"owner_uuid": user.uuid} | filter_params(values)
+    columns = get_columns(fields, sort.field)
+    if pagination.cursor is not None:
+        return await get_contacts_after_cursor(
+            session=session,
+            shape=shape,
+            params=params,
+            columns=columns,
+            pagination=pagination,
+            sort=sort,
+            fields=fields,
+        )
+
+    if include_total == "false":
+        total_source = None
+    elif shape is None:
+        total_source = "counter"
+    else:
+        total_source = "window" if include_total == "exact" else None
+
     offset = pagination.page * pagination.page_size
-    contacts = result[offset : offset + pagination.page_size]
-    return api_models.ContactsResponse(contacts=contacts, total=total)
+    rows = (
+        await session.execute(
+            contacts_statement(
+                shape, sort.field, sort.order, "page", columns, total_source
+            ),
+            params | {"limit": pagination.page_size + 1, "offset": offset},
+        )
+    ).all()
+    total = None
+    if total_source is not None:
+        if rows:
+            total = rows[0].total
+        elif offset == 0:
+            total = 0
+        else:
+            # The total is only returned alongside rows, so a page past the
+            # end needs its own statement to report it.
+            kind = "counter" if total_source == "counter" else "count"
+            total = await session.scalar(
+                contacts_statement(shape, None, None, kind), params
+            )
+    elif include_total == "estimate":
+        total = await estimate_total(session=session, shape=shape, params=params)
+    contacts = [dict(zip(columns, row)) for row in rows]
+    return get_contacts_page(
+        contacts=contacts, pagination=pagination, sort=sort, fields=fields, total=total
+    )
+
+
+async def get_contacts_after_cursor(
+    session: AsyncSession,
+    shape: tuple | None,
+    params: dict,
+    columns: tuple[str, ...],
+    pagination: api_models.Pagination,
+    sort: api_models.Sort,
+    fields: Optional[Sequence[str]],
+):
+    """Keyset pagination, the page is found by seeking past the cursor instead of
+    skipping rows, so every page costs the same. The total is not counted."""
+    try:
+        cursor = api_models.Cursor.decode(pagination.cursor)
+    except (ValueError, ValidationError):
+        raise InvalidCursorException
+    if cursor.field != sort.field or cursor.order != sort.order:
+        raise InvalidCursorException
+
+    rows = (
+        await session.execute(
+            contacts_statement(shape, sort.field, sort.order, "cursor", columns),
+            params
+            | {
+                "limit": pagination.page_size + 1,
+                "cursor_value": cursor.value,
+                "cursor_id": cursor.id,
+            },
+        )
+    ).all()
+    contacts = [dict(zip(columns, row)) for row in rows]
+    return get_contacts_page(
+        contacts=contacts, pagination=pagination, sort=sort, fields=fields
+    )
+
+
+def get_contacts_page(
+    contacts: list[dict],
+    pagination: api_models.Pagination,
+    sort: api_models.Sort,
+    fields: Optional[Sequence[str]] = None,
+    total: Optional[int] = None,
+):
+    """Builds the ContactsResponse content from a page fetched with one extra row,
+    which only tells whether a next page exists. The rows were validated when
+    they were written, so they are returned as plain dicts without validating
+    them again."""
+    next_cursor = None
+    if len(contacts) > pagination.page_size:
+        contacts = contacts[: pagination.page_size]
+        last = contacts[-1]
+        value = last[sort.field]
+        if sort.field in key_lookups:
+            value = key_lookups[sort.field](value)
+        next_cursor = api_models.Cursor(
+            field=sort.field, order=sort.order, value=value, id=last["id"]
+        ).encode()
+    # The sort field is only selected for the cursor when it wasn't asked for
+    if fields is not None and sort.field not in fields and sort.field != "id":
+        for contact in contacts:
+            del contact[sort.field]
+    return {"contacts": contacts, "total": total, "next_cursor": next_cursor}
+
+
+# Rows sampled by an estimated total, a user with fewer contacts gets the exact total
+estimate_sample_size = 1000
+
+
+async def estimate_total(session: AsyncSession, shape: tuple | None, params: dict):
+    """Scales the share of the user's first contacts which pass the filter to the
+    user's contact_count, so the cost is bounded however selective the filter is"""
+    row = (
+        await session.execute(
+            contacts_statement(shape, None, None, "estimate"),
+            params | {"sample_size": estimate_sample_size},
+        )
+    ).one()
+    if row.sampled < estimate_sample_size:
+        return row.matched
+    return round(row.matched * row.contact_count / row.sampled)
+
+
+export_chunk_size = 500
+
+
+async def export_contacts(
+    filter: api_models.Filter | api_models.FilterGroup,
+    sort: api_models.Sort,
+    user: db_models.User,
+    format: api_models.ExportFormats,
+):
+    """Streams the contacts as CSV or NDJSON text chunks. It opens its own session,
+    since the response is sent after the request's dependencies are closed."""
+    values = []
+    shape = get_filter_shape(filter, values)
+    async with db_models.ReadSession() as session:
+        rows = await session.stream(
+            contacts_statement(shape, sort.field, sort.order, "export"),
+            {"owner_uuid": user.uuid} | filter_params(values),
+        )
+        buffer = io.StringIO()
+        csv_writer = csv.writer(buffer)
+        if format == "csv":
+            csv_writer.writerow(contact_fields)
+
+        async for partition in rows.partitions():
+            for row in partition:
+                if format == "csv":
+                    csv_writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(contact_fields, row))) + "\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+# Listing statements are built once per filter shape and sort, the values are
+# bound when they run. Reusing the statement skips building it and computing
+# its compiled cache key on every request.
+statement_cache_size = 512
+
+
+@lru_cache(maxsize=statement_cache_size)
+def contacts_statement(
+    shape: tuple | None,
+    sort_field: Optional[str],
+    sort_order: Optional[api_models.SortOrders],
+    kind: Literal["page", "cursor", "count", "counter", "estimate", "export"],
+    columns: tuple[str, ...] = tuple(contact_fields),
+    total_source: Optional[Literal["window", "counter"]] = None,
+):
+    """Selects the columns of the user's contacts which pass the filter of the
+    shape. Binds owner_uuid and the filter values, page also binds limit and
+    offset, cursor binds limit, cursor_value and cursor_id, estimate binds
+    sample_size. A page has a total column when it has a total_source."""
+    owner = db_models.Contact.owner_uuid == bindparam("owner_uuid")
+    where_clause = and_(owner, get_filter(shape, count()))
+    contact_count = (
+        select(db_models.User.contact_count)
+        .where(db_models.User.uuid == bindparam("owner_uuid"))
+        .scalar_subquery()
+    )
+    selected = [getattr(db_models.Contact, column) for column in columns]
+    match kind:
+        case "page":
+            totals = {
+                None: [],
+                "window": [func.count().over().label("total")],
+                "counter": [contact_count.label("total")],
+            }
+            return (
+                select(*selected, *totals[total_source])
+                .where(where_clause)
+                .order_by(*get_sort(sort_field, sort_order))
+                .limit(bindparam("limit"))
+                .offset(bindparam("offset"))
+            )
+        case "cursor":
+            return (
+                select(*selected)
+                .where(where_clause)
+                .where(get_keyset(sort_field, sort_order))
+                .order_by(*get_sort(sort_field, sort_order))
+                .limit(bindparam("limit"))
+            )
+        case "count":
+            return select(func.count(db_models.Contact.id)).where(where_clause)
+        case "counter":
+            return select(contact_count)
+        case "estimate":
+            passed = case((get_filter(shape, count()), 1), else_=0)
+            sample = (
+                select(passed.label("passed"))
+                .where(owner)
+                # By id, a covering index would sample one end of its order
+                .order_by(db_models.Contact.id)
+                .limit(bindparam("sample_size"))
+                .subquery()
+            )
+            return select(
+                func.count().label("sampled"),
+                func.coalesce(func.sum(sample.c.passed), 0).label("matched"),
+                contact_count.label("contact_count"),
+            )
+        case "export":
+            return (
+                select(*selected)
+                .where(where_clause)
+                .order_by(*get_sort(sort_field, sort_order))
+                .execution_options(yield_per=export_chunk_size)
+            )
+
+
+def get_columns(fields: Optional[Sequence[str]], sort_field: str):
+    """The contact fields to select, in response order. The id is always selected,
+    and so is the sort field, which the next cursor needs."""
+    if fields is None:
+        return tuple(contact_fields)
+
+    wanted = {*fields, "id", sort_field}
+    return tuple(field for field in contact_fields if field in wanted)
+
+
+def sort_column(field: str) -> Column:
+    """The email and phone sort by their keys, whose indexes give the order"""
+    if field in key_lookups:
+        return getattr(db_models.Contact, f"{field}_key")
+    return getattr(db_models.Contact, field)
+
+
+def get_sort(field: str, order: api_models.SortOrders):
+    """Order clauses with the id as a tiebreaker, so the order is total"""
+    column = sort_column(field)
+    columns = [column] if field == "id" else [column, db_models.Contact.id]
 
+    if order == "desc":
+        return [column.desc() for column in columns]
 
-def get_sort(sort: api_models.Sort | None):
-    if sort is None:
-        return db_models.Contact.id.asc()
+    return [column.asc() for column in columns]
 
-    field: Column = getattr(db_models.Contact, sort.field)
 
-    if sort.order == "desc":
-        return field.desc()
+def get_keyset(field: str, order: api_models.SortOrders):
+    """Filters the rows which come after the bound cursor in the sort"""
+    cursor_id = bindparam("cursor_id")
+    if field == "id":
+        columns, values = [db_models.Contact.id], [cursor_id]
+    else:
+        columns, values = [sort_column(field), db_models.Contact.id], [
+            bindparam("cursor_value"),
+            cursor_id,
+        ]
 
-    return field.asc()
+    if order == "desc":
+        return tuple_(*columns) < tuple_(*values)
+
+    return tuple_(*columns) > tuple_(*values)
+
+
+def get_filter_shape(
+    filter: api_models.Filter | api_models.FilterGroup | None, values: list
+):
+    """The structure of the filter without its values, which are appended to
+    values in the order get_filter binds them. Filters of the same shape share a
+    statement. None is a filter every contact passes."""
+    if filter is None:
+        return None
+
+    # The default filter, contains "" matches every value of the NOT NULL columns
+    if (
+        isinstance(filter, api_models.Filter)
+        and filter.operator == "contains"
+        and not any(filter.values)
+    ):
+        return None
+
+    if isinstance(filter, api_models.FilterGroup):
+        items = tuple(get_filter_shape(item, values) for item in filter.filters)
+        return ("group", filter.combinator, items)
+
+    match filter.operator:
+        case "contains" | "starts_with" | "ends_with":
+            operands = filter.values
+            if filter.operator != "contains":
+                operands = operands[:1]
+            position = "start" if filter.operator == "starts_with" else "anywhere"
+            searched = []
+            for value in operands:
+                expression = search.match_expression(filter.field, value, position)
+                if expression is not None:
+                    values.append(expression)
+                values.append(value)
+                searched.append(expression is not None)
+            return ("filter", filter.field, filter.operator, tuple(searched))
+        case "is_any_of":
+            values.extend(lookup_values(filter))
+            return ("filter", filter.field, filter.operator, len(filter.values))
+        case _:
+            values.append(lookup_values(filter)[0])
+            return ("filter", filter.field, filter.operator, None)
+
+
+# Equality on the email and phone compares their normalized keys, which are indexed
+key_lookups = {"email": db_models.email_key, "phone": db_models.phone_key}
+key_operators = ("=", "!=", "equals", "is_any_of")
+
+
+def lookup_values(filter: api_models.Filter):
+    """The filter's values, normalized when the filter compares a key column"""
+    normalize = key_lookups.get(filter.field)
+    if normalize is None or filter.operator not in key_operators:
+        return filter.values
+    return [normalize(value) for value in filter.values]
+
+
+def filter_params(values: list):
+    return {f"filter_{index}": value for index, value in enumerate(values)}
 
 
 ops = {
@@ -61,29 +436,61 @@ ops = {
 }
 
 
-def get_filter(filter: api_models.Filter | None):
-    if filter is None:
-        return db_models.Contact.first_name.contains("")
+def get_filter(shape: tuple | None, indexes: Iterator[int]):
+    """The WHERE clause of a filter shape, with a filter_<index> parameter for
+    every value. A filter group compiles to one predicate."""
+    if shape is None:
+        return true()
 
-    field: Column = getattr(db_models.Contact, filter.field)
+    def value():
+        return bindparam(f"filter_{next(indexes)}")
 
-    match filter.operator:
-        case "contains":
-            return and_(*[field.contains(value) for value in filter.values])
-        case "ends_with":
-            return field.endswith(filter.values[0])
-        case "equals":
-            return field.is_(filter.values[0])
+    if shape[0] == "group":
+        _, combinator, items = shape
+        combine = and_ if combinator == "and" else or_
+        return combine(*[get_filter(item, indexes) for item in items])
+
+    _, field_name, operator, detail = shape
+    if field_name in key_lookups and operator in key_operators:
+        field_name = f"{field_name}_key"
+    field: Column = getattr(db_models.Contact, field_name)
+
+    match operator:
+        case "contains" | "starts_with" | "ends_with":
+            return and_(
+                *[text_filter(field, value, operator, searched) for searched in detail]
+            )
+        case "equals" | "is_empty":
+            return field.is_(value())
         case "is_any_of":
-            return or_(*[field.is_(value) for value in filter.values])
-        case "is_empty":
-            return field.is_(filter.values[0])
+            return or_(*[field.is_(value()) for _ in range(detail)])
         case "is_not_empty":
-            return field.is_not(filter.values[0])
-        case "starts_with":
-            return field.startswith(filter.values[0])
+            return field.is_not(value())
         case "<" | "!=" | ">" | ">=" | "<=" | "=":
-            return ops[filter.operator](field, filter.values[0])
+            return ops[operator](field, value())
+
+
+def text_filter(
+    field: Column,
+    value: Callable[[], BindParameter],
+    operator: Literal["contains", "starts_with", "ends_with"],
+    searched: bool,
+):
+    """LIKE filter, narrowed down by the FTS index when it can answer the value.
+    The FTS expression is bound before the LIKE value."""
+    ids = search.match_ids(value()) if searched else None
+    match operator:
+        case "contains":
+            like = field.contains(value())
+        case "starts_with":
+            like = field.startswith(value())
+        case "ends_with":
+            like = field.endswith(value())
+
+    if ids is None:
+        return like
+
+    return and_(db_models.Contact.id.in_(ids), like)
 
 
 async def create_contact(
@@ -91,30 +498,197 @@ async def create_contact(
     contact: api_models.ContactCreateRequest,
     user: db_models.User,
 ):
-    await check_unique_contact(session=session, new_contact=contact, user=user)
-    db_contact = db_models.Contact(**contact.model_dump(), owner_uuid=user.uuid)
-    session.add(db_contact)
-    await session.commit()
-    await session.refresh(db_contact)
-    return db_contact
+    async def work(session: AsyncSession):
+        db_contact = db_models.Contact(**contact.model_dump(), owner_uuid=user.uuid)
+        session.add(db_contact)
+        await session.flush()
+        return api_models.ContactResponse.model_validate(db_contact)
+
+    try:
+        return await writer.write(session, work)
+    except IntegrityError as error:
+        raise unique_exception(error=error, instance=contact, table_name="contacts")
+
+
+async def find_conflicts(
+    session: AsyncSession,
+    contacts: Sequence[api_models.ContactCreateRequest],
+    user: db_models.User,
+) -> list[Optional[UniqueException]]:
+    """Checks the normalized email and phone keys of the contacts against the
+    user's contacts in one query and against the contacts before them in the list.
+    Returns the conflict of each contact."""
+    keys = [
+        (db_models.email_key(contact.email), db_models.phone_key(contact.phone))
+        for contact in contacts
+    ]
+    rows = await session.execute(
+        select(db_models.Contact.email_key, db_models.Contact.phone_key).where(
+            db_models.Contact.owner_uuid == user.uuid,
+            or_(
+                db_models.Contact.email_key.in_({email for email, _ in keys}),
+                db_models.Contact.phone_key.in_({phone for _, phone in keys}),
+            ),
+        )
+    )
+    taken_emails, taken_phones = set(), set()
+    for email, phone in rows:
+        taken_emails.add(email)
+        taken_phones.add(phone)
+
+    conflicts = []
+    for contact, (email, phone) in zip(contacts, keys):
+        if email in taken_emails:
+            conflicts.append(UniqueException(field="email", value=contact.email))
+        elif phone in taken_phones:
+            conflicts.append(UniqueException(field="phone", value=contact.phone))
+        else:
+            conflicts.append(None)
+            taken_emails.add(email)
+            taken_phones.add(phone)
+    return conflicts
+
+
+async def insert_contacts(
+    session: AsyncSession,
+    contacts: Sequence[api_models.ContactCreateRequest],
+    user: db_models.User,
+):
+    """Inserts every contact without a conflict with one multi-row INSERT and
+    commits. Returns the conflict of each contact and the ids of the created ones."""
+
+    async def work(session: AsyncSession):
+        conflicts = await find_conflicts(session=session, contacts=contacts, user=user)
+        values = [
+            contact.model_dump() | {"owner_uuid": user.uuid}
+            for contact, conflict in zip(contacts, conflicts)
+            if conflict is None
+        ]
+        ids = []
+        if values:
+            # Ordering RETURNING by parameter would make SQLAlchemy insert row by
+            # row on SQLite. The rowids of one INSERT are allocated in row order,
+            # so sorting them gives the same order.
+            ids = sorted(
+                await session.scalars(
+                    insert(db_models.Contact).returning(db_models.Contact.id), values
+                )
+            )
+        return conflicts, ids
+
+    return await writer.write_checked(session, work)
 
 
-async def check_unique_contact(
+async def create_contacts(
     session: AsyncSession,
-    new_contact: api_models.UpdateContactRequest,
+    contacts: Sequence[api_models.ContactCreateRequest],
     user: db_models.User,
-    exclude_id: Optional[int] = None,
 ):
-    user_contacts = await session.scalars(
-        select(db_models.Contact).where(db_models.Contact.owner_uuid == user.uuid)
+    """Creates every contact without a conflict in one transaction"""
+    conflicts, ids = await insert_contacts(
+        session=session, contacts=contacts, user=user
     )
-    for contact in user_contacts:
-        if exclude_id == contact.id:
-            continue
-        if contact.email == new_contact.email:
-            raise UniqueException(field="email", value=new_contact.email)
-        if contact.phone == new_contact.phone:
-            raise UniqueException(field="phone", value=new_contact.phone)
+    created_ids = iter(ids)
+    results = []
+    for index, (contact, conflict) in enumerate(zip(contacts, conflicts)):
+        if conflict is None:
+            result = api_models.BatchResult(
+                index=index,
+                status="created",
+                contact=api_models.ContactResponse(
+                    **contact.model_dump(), id=next(created_ids)
+                ),
+            )
+        else:
+            result = api_models.BatchResult(
+                index=index, status="conflict", detail=conflict.detail
+            )
+        results.append(result)
+    return api_models.BatchResponse(results=results, created=len(ids))
+
+
+async def import_contacts(
+    session: AsyncSession,
+    file: IO[bytes],
+    format: api_models.ImportFormats,
+    user: db_models.User,
+):
+    """Imports the contacts of a CSV or vCard file, committing every chunk of
+    config.import_chunk_size rows. The file is parsed a chunk at a time on a
+    worker thread, so it is never read into memory whole. A row which can't be
+    read stops the import, the rows before it stay imported and the report ends
+    with a fatal error for it."""
+    read = parsers.read_csv if format == "csv" else parsers.read_vcard
+    rows = enumerate(read(parsers.decode_lines(file)), start=1)
+    report = api_models.ImportResponse()
+
+    def add_error(row: int, detail: str):
+        report.failed += 1
+        if len(report.errors) < max_import_errors:
+            report.errors.append(api_models.ImportRowError(row=row, detail=detail))
+
+    def read_chunk():
+        """The next rows, and the error which stopped reading them"""
+        chunk = []
+        try:
+            for item in islice(rows, config.import_chunk_size):
+                chunk.append(item)
+        except (UnicodeDecodeError, csv.Error) as error:
+            return chunk, error
+        return chunk, None
+
+    while True:
+        chunk, read_error = await run_in_threadpool(read_chunk)
+        if read_error is not None and report.rows == 0 and not chunk:
+            # Nothing was imported, the file can't be read at all
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Could not read row 1 of the file: {read_error}",
+            )
+        report.rows += len(chunk)
+        numbers, contacts = [], []
+        for number, row in chunk:
+            try:
+                contacts.append(api_models.ContactCreateRequest.model_validate(row))
+                numbers.append(number)
+            except ValidationError as error:
+                add_error(number, validation_detail(error))
+        if contacts:
+            conflicts, ids = await insert_contacts(
+                session=session, contacts=contacts, user=user
+            )
+            report.created += len(ids)
+            for number, conflict in zip(numbers, conflicts):
+                if conflict is not None:
+                    add_error(number, conflict.detail)
+
+        if read_error is not None:
+            # The rows before it are committed, so the report tells where it stopped
+            report.rows += 1
+            report.failed += 1
+            report.errors.append(
+                api_models.ImportRowError(
+                    row=report.rows,
+                    detail=f"Could not read the row, the import stopped here: "
+                    f"{read_error}",
+                    fatal=True,
+                )
+            )
+            break
+        if not chunk:
+            break
+    return report
+
+
+max_import_errors = 1000
+
+
+def validation_detail(error: ValidationError):
+    messages = []
+    for detail in error.errors():
+        location = ".".join(str(part) for part in detail["loc"]) or "contact"
+        messages.append(f"{location}: {detail['msg']}")
+    return "; ".join(messages)
 
 
 async def edit_contact(
@@ -123,33 +697,153 @@ async def edit_contact(
     contact_id: int,
     user: db_models.User,
 ):
-    await check_unique_contact(
-        session=session, new_contact=contact, user=user, exclude_id=contact_id
-    )
-    db_contact = await get_contact_by_id(
-        session=session, contact_id=contact_id, user=user
-    )
-    if contact.email:
-        db_contact.email = contact.email
-    if contact.phone:
-        db_contact.phone = contact.phone
-    if contact.first_name:
-        db_contact.first_name = contact.first_name
-    if contact.last_name:
-        db_contact.last_name = contact.last_name
-    
-    await session.commit()
-    await session.refresh(db_contact)
-    return db_contact
-
-
-async def delete_contacts(session: AsyncSession, ids: list[int], user: db_models.User):
-    db_contacts = [
-        (await get_contact_by_id(session=session, contact_id=id, user=user))
-        for id in ids
-    ]
-    for contact in db_contacts:
-        await session.delete(contact)
+    """Updates the given fields with one UPDATE ... RETURNING"""
+    values = {field: value for field, value in contact.model_dump().items() if value}
+    if not values:
+        return await get_contact_by_id(session=session, contact_id=contact_id, user=user)
+
+    async def work(session: AsyncSession):
+        row = (
+            await session.execute(
+                update(db_models.Contact)
+                .where(
+                    db_models.Contact.id == contact_id,
+                    db_models.Contact.owner_uuid == user.uuid,
+                )
+                .values(values)
+                .returning(*contact_columns)
+            )
+        ).one_or_none()
+        if row is None:
+            raise NotFoundException(field="id", value=contact_id, object_type="Contact")
+        return api_models.ContactResponse(**row._asdict())
+
+    try:
+        return await writer.write(session, work)
+    except IntegrityError as error:
+        raise unique_exception(error=error, instance=contact, table_name="contacts")
+
+
+async def edit_contacts(
+    session: AsyncSession,
+    items: Sequence[api_models.BatchUpdateItem],
+    user: db_models.User,
+):
+    """Applies many edits in one transaction. The edited contacts and every contact
+    holding one of the new emails or phones are read in one query, the edits are
+    checked in order against them and written with one executemany UPDATE. Emails
+    and phones are compared by their normalized keys."""
+    email_key, phone_key = db_models.email_key, db_models.phone_key
+
+    async def work(session: AsyncSession):
+        ids = {item.id for item in items}
+        emails = {email_key(item.contact.email) for item in items if item.contact.email}
+        phones = {phone_key(item.contact.phone) for item in items if item.contact.phone}
+        rows = await session.execute(
+            select(*contact_columns).where(
+                db_models.Contact.owner_uuid == user.uuid,
+                or_(
+                    db_models.Contact.id.in_(ids),
+                    db_models.Contact.email_key.in_(emails),
+                    db_models.Contact.phone_key.in_(phones),
+                ),
+            )
+        )
+        # Sets, contacts saved before the case insensitive email index may share
+        # a key
+        email_owners, phone_owners, contacts = defaultdict(set), defaultdict(set), {}
+        for row in rows:
+            email_owners[email_key(row.email)].add(row.id)
+            phone_owners[phone_key(row.phone)].add(row.id)
+            if row.id in ids:
+                contacts[row.id] = row._asdict()
+
+        results, updates = [], []
+        for index, item in enumerate(items):
+            contact = contacts.get(item.id)
+            if contact is None:
+                results.append(
+                    api_models.BatchResult(
+                        index=index,
+                        status="not_found",
+                        detail=NotFoundException(
+                            object_type="Contact", field="id", value=item.id
+                        ).detail,
+                    )
+                )
+                continue
+
+            changes = item.contact.model_dump(exclude_none=True)
+            changes = {field: value for field, value in changes.items() if value}
+            edited = contact | changes
+            conflict = None
+            # An unchanged value is left as it is, even if another contact shares
+            # its key
+            if edited["email"] != contact["email"] and (
+                email_owners[email_key(edited["email"])] - {item.id}
+            ):
+                conflict = UniqueException(field="email", value=edited["email"])
+            elif edited["phone"] != contact["phone"] and (
+                phone_owners[phone_key(edited["phone"])] - {item.id}
+            ):
+                conflict = UniqueException(field="phone", value=edited["phone"])
+            if conflict is not None:
+                results.append(
+                    api_models.BatchResult(
+                        index=index, status="conflict", detail=conflict.detail
+                    )
+                )
+                continue
+
+            email_owners[email_key(contact["email"])].discard(item.id)
+            phone_owners[phone_key(contact["phone"])].discard(item.id)
+            email_owners[email_key(edited["email"])].add(item.id)
+            phone_owners[phone_key(edited["phone"])].add(item.id)
+            contacts[item.id] = edited
+            updates.append(edited)
+            results.append(
+                api_models.BatchResult(
+                    index=index,
+                    status="updated",
+                    contact=api_models.ContactResponse(**edited),
+                )
+            )
+
+        # Updated in the checked order, an edit may take a value an earlier one freed
+        if updates:
+            await session.execute(update(db_models.Contact), updates)
+        return api_models.BatchResponse(results=results, updated=len(updates))
+
+    return await writer.write_checked(session, work)
+
+
+async def delete_contacts(
+    session: AsyncSession,
+    ids: Sequence[int],
+    user: db_models.User,
+    partial: bool = False,
+):
+    """Deletes the user's contacts with one DELETE ... RETURNING. Unless partial,
+    nothing is deleted and error 404 is raised if any id is missing."""
+    async def work(session: AsyncSession):
+        db_contacts = await session.scalars(
+            delete(db_models.Contact)
+            .where(
+                db_models.Contact.owner_uuid == user.uuid,
+                db_models.Contact.id.in_(set(ids)),
+            )
+            .returning(db_models.Contact)
+        )
+        contacts = [
+            api_models.ContactResponse.model_validate(db_contact)
+            for db_contact in db_contacts
+        ]
+        missing_ids = sorted(set(ids) - {contact.id for contact in contacts})
+        if missing_ids and not partial:
+            raise NotFoundException(
+                field="id", value=missing_ids[0], object_type="Contact"
+            )
+
+        return api_models.DeleteResponse(contacts=contacts, missing_ids=missing_ids)
 
-    await session.commit()
-    return db_contacts
+    return await writer.write(session, work)
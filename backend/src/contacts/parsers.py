@@ -0,0 +1,84 @@
+import codecs
+import csv
+import re
+from typing import IO, Iterable, Iterator
+
+# Rows are plain dicts of the ContactCreateRequest fields, validated by the caller
+
+
+def decode_lines(file: IO[bytes], encoding: str = "utf-8-sig") -> Iterator[str]:
+    """Decodes a binary file a line at a time, so that a decoding error is raised
+    while reading the row which holds it rather than a few rows ahead. Lines end
+    at LF, CRLF or a lone CR, as when a file is opened with newline=""."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for line in file:
+        yield from filter(None, re.split(r"(?<=\r)(?!\n)", decoder.decode(line)))
+    if tail := decoder.decode(b"", final=True):
+        yield tail
+
+
+def read_csv(file: Iterable[str]) -> Iterator[dict[str, str]]:
+    """Reads contacts from a CSV with a header row, like the one export writes.
+    Columns which aren't contact fields, such as id, are ignored."""
+    for row in csv.DictReader(file):
+        yield {key.strip(): value for key, value in row.items() if key is not None}
+
+
+def unfold(lines: Iterable[str]) -> Iterator[str]:
+    """Joins vCard continuation lines, which start with a space or a tab"""
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def unescape(value: str):
+    return (
+        value.replace("\\n", "\n")
+        .replace("\\N", "\n")
+        .replace("\\,", ",")
+        .replace("\\;", ";")
+        .replace("\\\\", "\\")
+    )
+
+
+def read_vcard(file: Iterable[str]) -> Iterator[dict[str, str]]:
+    """Reads contacts from vCard 3.0 or 4.0 cards. The first TEL and EMAIL are
+    used, the names come from N, or from FN when N is missing."""
+    card = None
+    for line in unfold(file):
+        if ":" not in line:
+            continue
+        key, value = line.split(":", 1)
+        name = key.split(";", 1)[0].split(".")[-1].upper()
+
+        if name == "BEGIN" and value.strip().upper() == "VCARD":
+            card = {}
+        elif card is None:
+            continue
+        elif name == "END" and value.strip().upper() == "VCARD":
+            if "full_name" in card:
+                first_name, _, last_name = card.pop("full_name").partition(" ")
+                card.setdefault("first_name", first_name)
+                card.setdefault("last_name", last_name)
+            yield card
+            card = None
+        elif name == "N":
+            last_name, first_name = (value.split(";") + [""])[:2]
+            card["last_name"] = unescape(last_name).strip()
+            card["first_name"] = unescape(first_name).strip()
+            card.pop("full_name", None)
+        elif name == "FN" and "first_name" not in card:
+            card["full_name"] = unescape(value).strip()
+        elif name == "TEL":
+            phone = unescape(value).strip()
+            card.setdefault("phone", phone[4:] if phone.startswith("tel:") else phone)
+        elif name == "EMAIL":
+            card.setdefault("email", unescape(value).strip())
@@ -1,19 +1,49 @@
 
+import hashlib
 import json
 from pydantic import ValidationError
+import pydantic_core
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Query
-from src.exceptions import NotFoundException, UniqueException
+from typing import Annotated, Any, Optional
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.exceptions import (
+    ErrorResponse,
+    InvalidCursorException,
+    NotFoundException,
+    NotModifiedException,
+    UniqueException,
+)
 from src.contacts import contact_service
 from src.db import db_models
-from src.dependencies import get_session
+from src.dependencies import get_read_session, get_session
 from src.contacts import api_models
 from src.dependencies import get_current_active_user
 
 contacts_router = APIRouter()
 
-@contacts_router.post("", response_model=api_models.ContactResponse)
+
+class FastJSONResponse(JSONResponse):
+    """Encodes plain data with pydantic-core's serializer instead of the stdlib
+    encoder. Returning it skips the validation of the route's response_model."""
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
+
+
+@contacts_router.post(
+    "",
+    response_model=api_models.ContactResponse,
+    responses={409: {"model": UniqueException.Model}},
+)
 async def create_contact(
     contact: api_models.ContactCreateRequest,
     current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
@@ -24,51 +54,226 @@ async def create_contact(
     )
 
 
+@contacts_router.post("/batch", response_model=api_models.BatchResponse)
+async def create_contacts(
+    contacts: api_models.BatchCreateRequest,
+    current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
+    session: Annotated[AsyncSession, Depends(get_session)],
+):
+    """Use this to create many contacts at once. Contacts which clash with a saved
+    contact or with an earlier contact in the list are reported and skipped."""
+    return await contact_service.create_contacts(
+        session=session, contacts=contacts, user=current_user
+    )
+
+
+@contacts_router.patch("/batch", response_model=api_models.BatchResponse)
+async def update_contacts(
+    items: api_models.BatchUpdateRequest,
+    current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
+    session: Annotated[AsyncSession, Depends(get_session)],
+):
+    """Use this to update many contacts at once. Edits are applied in order, an
+    edit whose contact is missing or which clashes with another contact is
+    reported and skipped."""
+    return await contact_service.edit_contacts(
+        session=session, items=items, user=current_user
+    )
+
+
+@contacts_router.post(
+    "/import",
+    response_model=api_models.ImportResponse,
+    responses={400: {"model": ErrorResponse}},
+)
+async def import_contacts(
+    file: UploadFile,
+    current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    format: Annotated[
+        Optional[api_models.ImportFormats],
+        Query(description="Defaults to vcard for .vcf and .vcard files, else csv"),
+    ] = None,
+):
+    """Use this to import a CSV file with a header row, like the export's, or a
+    vCard file. Rows which are invalid or clash with a saved contact are skipped
+    and reported. A row which can't be read stops the import, it is reported as
+    a fatal error after the rows imported before it."""
+    if format is None:
+        extension = (file.filename or "").rsplit(".", 1)[-1].lower()
+        format = "vcard" if extension in ("vcf", "vcard") else "csv"
+    return await contact_service.import_contacts(
+        session=session, file=file.file, format=format, user=current_user
+    )
+
+
+async def check_etag(
+    request: Request,
+    response: Response,
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+    current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
+):
+    """Answers If-None-Match with 304 when the user's contacts are unchanged, the
+    ETag hashes the user's data version and the requested URL"""
+    version = await contact_service.get_data_version(
+        session=session, user=current_user
+    )
+    digest = hashlib.sha256(
+        f"{current_user.uuid}:{version}:{request.url.path}?{request.url.query}".encode()
+    ).hexdigest()
+    etag = f'W/"{digest[:32]}"'
+    if_none_match = request.headers.get("If-None-Match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        raise NotModifiedException(etag=etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
 def QueryField():
     return Query(
         description="A contact field. Check the contact request schema for valid options."
     )
 
 
-@contacts_router.get("", response_model=api_models.ContactsResponse)
-async def read_contacts(
-    current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
-    session: Annotated[AsyncSession, Depends(get_session)],
-    page: Annotated[int, Query(description="Zero indexed page number")] = 0,
-    page_size: int = 20,
+def get_sort(
     sort_field: Annotated[str, QueryField()] = "id",
     sort_order: api_models.SortOrders = "asc",
+):
+    try:
+        return api_models.Sort(field=sort_field, order=sort_order)
+    except ValidationError as error:
+        raise HTTPException(422, detail=json.loads(error.json()))
+
+
+def get_filter(
     filter_field: Annotated[str, QueryField()] = "id",
     filter_operator: api_models.FilterOperators = "contains",
     filter_values: Annotated[list[str], Query()] = [""],
+    filters: Annotated[
+        Optional[str],
+        Query(
+            description="A filter group as JSON, e.g. "
+            '{"combinator": "or", "filters": [{"field": "first_name", "operator": '
+            '"starts_with", "values": ["A"]}, {"combinator": "and", "filters": '
+            "[...]}]}. When given, the other filter parameters are ignored"
+        ),
+    ] = None,
 ):
-    """Use this to get wanted contacts. All query parameters are optional."""
     try:
-        pagination = api_models.Pagination(page=page, page_size=page_size)
-        filter = api_models.Filter(
+        if filters is not None:
+            return api_models.FilterGroup.model_validate_json(filters)
+        return api_models.Filter(
             field=filter_field, operator=filter_operator, values=filter_values
         )
-        sort = api_models.Sort(field=sort_field, order=sort_order)
     except ValidationError as error:
         raise HTTPException(422, detail=json.loads(error.json()))
 
-    return await contact_service.get_contacts(
+
+def get_fields(
+    fields: Annotated[
+        Optional[list[str]],
+        Query(
+            description="Contact fields to return, the id is always returned. "
+            "Returns every field when omitted."
+        ),
+    ] = None,
+):
+    if fields is None:
+        return None
+    try:
+        return [api_models.ContactField(field=field).field for field in fields]
+    except ValidationError as error:
+        raise HTTPException(422, detail=json.loads(error.json()))
+
+
+@contacts_router.get(
+    "",
+    response_model=api_models.ContactsResponse | api_models.SparseContactsResponse,
+    responses={400: {"model": InvalidCursorException.Model}, 304: {}},
+    dependencies=[Depends(check_etag)],
+)
+async def read_contacts(
+    response: Response,
+    current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+    sort: Annotated[api_models.Sort, Depends(get_sort)],
+    filter: Annotated[
+        api_models.Filter | api_models.FilterGroup, Depends(get_filter)
+    ],
+    fields: Annotated[Optional[list[str]], Depends(get_fields)],
+    page: Annotated[int, Query(description="Zero indexed page number")] = 0,
+    page_size: int = 20,
+    cursor: Annotated[
+        Optional[str],
+        Query(
+            description="next_cursor of the previous page. When given, page is ignored"
+            " and the total is not counted"
+        ),
+    ] = None,
+    include_total: Annotated[
+        api_models.TotalModes,
+        Query(
+            description="Without a filter the total is always exact and free. With"
+            " one, exact counts every match, estimate scales the matches among the"
+            " first 1000 contacts, and false leaves the total out"
+        ),
+    ] = "exact",
+):
+    """Use this to get wanted contacts. All query parameters are optional."""
+    try:
+        pagination = api_models.Pagination(
+            page=page, page_size=page_size, cursor=cursor
+        )
+    except ValidationError as error:
+        raise HTTPException(422, detail=json.loads(error.json()))
+
+    page = await contact_service.get_contacts(
         session=session,
         pagination=pagination,
         filter=filter,
         sort=sort,
         user=current_user,
+        fields=fields,
+        include_total=include_total,
+    )
+    # The ETag headers were set on the dependencies' response
+    return FastJSONResponse(page, headers=response.headers)
+
+
+@contacts_router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/csv": {}, "application/x-ndjson": {}}}},
+)
+async def export_contacts(
+    current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
+    sort: Annotated[api_models.Sort, Depends(get_sort)],
+    filter: Annotated[
+        api_models.Filter | api_models.FilterGroup, Depends(get_filter)
+    ],
+    format: api_models.ExportFormats = "csv",
+):
+    """Use this to download all wanted contacts. Takes the filter and sort
+    parameters of the contacts listing."""
+    media_types = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+    return StreamingResponse(
+        contact_service.export_contacts(
+            filter=filter, sort=sort, user=current_user, format=format
+        ),
+        media_type=media_types[format],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'},
     )
 
 
 @contacts_router.get(
     "/{contact_id}",
     response_model=api_models.ContactResponse,
-    responses={404: {"model": NotFoundException.Model}},
+    responses={404: {"model": NotFoundException.Model}, 304: {}},
+    dependencies=[Depends(check_etag)],
 )
 async def read_contact(
     contact_id: int,
-    session: Annotated[AsyncSession, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
     current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
 ):
     """Use this to get a certain contact with a known id."""
@@ -101,7 +306,7 @@ async def update_contact(
 @contacts_router.delete(
     "",
     status_code=200,
-    response_model=api_models.ContactResponse,
+    response_model=api_models.DeleteResponse,
     responses={404: {"model": NotFoundException.Model}},
 )
 async def delete_contacts(
@@ -110,11 +315,18 @@ async def delete_contacts(
     ],
     session: Annotated[AsyncSession, Depends(get_session)],
     current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
+    partial: Annotated[
+        bool,
+        Query(
+            description="Delete the contacts which exist and list the missing ids,"
+            " instead of failing with 404 without deleting anything"
+        ),
+    ] = False,
 ):
     """Use this to delete multiple contacts."""
-    return (
-        await contact_service.delete_contacts(session=session, ids=ids, user=current_user)
-    )[0]
+    return await contact_service.delete_contacts(
+        session=session, ids=ids, user=current_user, partial=partial
+    )
 
 
 @contacts_router.delete(
@@ -124,13 +336,11 @@ async def delete_contacts(
     responses={404: {"model": NotFoundException.Model}},
 )
 async def delete_contact(
-    contact_id: str,
+    contact_id: int,
     session: Annotated[AsyncSession, Depends(get_session)],
     current_user: Annotated[db_models.User, Depends(get_current_active_user("access"))],
 ):
     """Use this to delete a contact."""
-    return api_models.DeleteResponse(
-        contacts=await contact_service.delete_contacts(
-            session=session, ids=[contact_id], user=current_user
-        )
-    )
\ No newline at end of file
+    return await contact_service.delete_contacts(
+        session=session, ids=[contact_id], user=current_user
+    )
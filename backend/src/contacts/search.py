@@ -0,0 +1,56 @@
+from typing import Literal
+from sqlalchemy import BindParameter, bindparam, column, select, table, text
+from src.db.db_models import User, db, owner_shift
+
+# Created by an optional migration, it is only used when it exists
+contacts_search = table("contacts_search", column("rowid"), column("contacts_search"))
+fts_fields = ["first_name", "last_name", "email", "phone"]
+
+# Trigrams can't match a term shorter than three characters
+min_term_length = 3
+
+enabled = False
+
+
+async def init():
+    """Checks whether the FTS5 table exists, text filters fall back to LIKE if not"""
+    global enabled
+    async with db.get_engine().connect() as connection:
+        enabled = bool(
+            await connection.scalar(
+                text(
+                    "SELECT 1 FROM sqlite_master "
+                    "WHERE type = 'table' AND name = 'contacts_search'"
+                )
+            )
+        )
+
+
+def match_expression(
+    field: str, value: str, position: Literal["anywhere", "start"] = "anywhere"
+):
+    """The FTS5 query for contacts whose field contains the value, or None when
+    the FTS table can't answer it"""
+    if not enabled or field not in fts_fields or len(value) < min_term_length:
+        return None
+
+    phrase = '"' + value.replace('"', '""') + '"'
+    if position == "start":
+        phrase = f"^{phrase}"
+    return f"{field} : {phrase}"
+
+
+def match_ids(expression: str | BindParameter[str]):
+    """Selects the ids of the bound owner's contacts matching a match_expression.
+    The rowid range keeps the index from reading the matches of other owners."""
+    first_rowid = (
+        select(User.number.op("<<")(owner_shift))
+        .where(User.uuid == bindparam("owner_uuid"))
+        .scalar_subquery()
+    )
+    rowid = contacts_search.c.rowid
+    return select(rowid.op("&")((1 << owner_shift) - 1)).where(
+        contacts_search.c.contacts_search.match(expression),
+        rowid >= first_rowid,
+        rowid < first_rowid + (1 << owner_shift),
+    )
@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import sys
+from src.db.db_models import db
+from src.db import migrations
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Address book schema migrations")
+    parser.add_argument(
+        "--status", action="store_true", help="print the versions without migrating"
+    )
+    parser.add_argument("--target", type=int, default=migrations.latest_version)
+    parser.add_argument(
+        "--resolve",
+        action="store_true",
+        help="resolve the saved rows which block a migration, printing what changed",
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.status:
+            async with db.get_engine().connect() as connection:
+                version = await migrations.get_version(connection)
+                skipped = await migrations.get_skipped(connection)
+            print(
+                f"database version {version}, "
+                f"latest version {migrations.latest_version}"
+            )
+            if skipped:
+                print(f"skipped migrations {', '.join(map(str, sorted(skipped)))}")
+        else:
+            await db.create_all()
+            version = await migrations.upgrade(
+                target=args.target, resolve_conflicts=args.resolve
+            )
+            print(f"database migrated to version {version}")
+    except migrations.MigrationError as error:
+        sys.exit(str(error))
+    finally:
+        await db.get_engine().dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
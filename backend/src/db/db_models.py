@@ -1,12 +1,56 @@
+import re
+import string
+from typing import Optional
 from alchemical.aio import Alchemical
-from sqlalchemy import ForeignKey
+from sqlalchemy import Computed, ForeignKey, Index, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from uuid import UUID, uuid4
+from src import config, metrics
 
-db = Alchemical("sqlite:///backend//src//db//instance//addressbook.db")
+# aiosqlite defaults to a new connection per session, pooling them keeps the
+# page cache and saves applying the pragmas on every request. Writes return what
+# they wrote, so nothing is expired and reloaded after a commit.
+db = Alchemical(
+    config.database_url,
+    engine_options={"poolclass": AsyncAdaptedQueuePool},
+    session_options={"expire_on_commit": False},
+)
+
+
+def set_pragmas(dbapi_connection, _connection_record):
+    """Applies the storage profile of config.sqlite_pragmas to a new connection"""
+    cursor = dbapi_connection.cursor()
+    for name, value in config.sqlite_pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def set_query_only(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+
+event.listen(db.get_engine().sync_engine, "connect", set_pragmas)
+metrics.instrument(db.get_engine(), "primary")
+
+# Read-only paths use their own connections, so that long listings never wait
+# for a connection held by a write
+reader_engine = create_async_engine(
+    db.get_engine().url,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=config.reader_pool_size,
+)
+event.listen(reader_engine.sync_engine, "connect", set_pragmas)
+event.listen(reader_engine.sync_engine, "connect", set_query_only)
+metrics.instrument(reader_engine, "reader")
+ReadSession = async_sessionmaker(reader_engine, expire_on_commit=False)
 
 class User(db.Model):
     __tablename__ = "users"
+    __table_args__ = (Index("uq_users_number", "number", unique=True),)
     
     
     uuid: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
@@ -18,6 +62,11 @@ class User(db.Model):
     refresh_token: Mapped[str] = mapped_column(unique=False, default="")
     security_token: Mapped[str] = mapped_column(unique=False, default="")
     is_logged_in: Mapped[bool] = mapped_column(unique=False, default=False)
+    data_version: Mapped[int] = mapped_column(unique=False, default=0, server_default="0")
+    contact_count: Mapped[int] = mapped_column(unique=False, default=0, server_default="0")
+    # Small integer id, set by a trigger on insert. It prefixes the rowids of the
+    # user's contacts in the search index.
+    number: Mapped[Optional[int]] = mapped_column(unique=False)
 
     contacts = relationship("Contact", back_populates="owner")
 
@@ -26,8 +75,43 @@ class User(db.Model):
         self.display_name = display_name
         self.hashed_password = hashed_password
 
+# The search index keys a contact by its owner's number shifted left by this many
+# bits plus its id, so that a rowid range holds the contacts of one owner
+owner_shift = 32
+
+
+# Lookup keys of the contacts, generated by SQLite on every write. The functions
+# build the same key from a value in Python, SQLite's lower() only folds ASCII.
+email_key_expression = "lower(email)"
+phone_key_expression = "replace(replace(phone, '+', ''), '-', '')"
+ascii_lowercase = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def email_key(email: str):
+    return email.translate(ascii_lowercase)
+
+
+def phone_key(phone: str):
+    """The digits of the phone number, in E.164 order without the plus"""
+    return re.sub(r"\D", "", phone)
+
+
+# The key indexes keep the email and phone unique per owner. A database with
+# contacts whose emails differ only in case keeps the exact email index instead,
+# see migrations 8 and 10.
 class Contact(db.Model):
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index(
+            "uq_contacts_owner_uuid_email_key", "owner_uuid", "email_key", unique=True
+        ),
+        Index(
+            "uq_contacts_owner_uuid_phone_key", "owner_uuid", "phone_key", unique=True
+        ),
+        Index("ix_contacts_owner_uuid", "owner_uuid"),
+        Index("ix_contacts_owner_uuid_first_name", "owner_uuid", "first_name", "id"),
+        Index("ix_contacts_owner_uuid_last_name", "owner_uuid", "last_name", "id"),
+    )
 
     def __init__(self, email: str, first_name: str, last_name: str, phone: str, owner_uuid: UUID):
         self.email = email
@@ -42,5 +126,7 @@ class Contact(db.Model):
     phone: Mapped[str] = mapped_column(unique=False)
     email: Mapped[str] = mapped_column(unique=False)
     owner_uuid: Mapped[UUID] = mapped_column(ForeignKey("users.uuid"))
+    email_key: Mapped[str] = mapped_column(Computed(email_key_expression))
+    phone_key: Mapped[str] = mapped_column(Computed(phone_key_expression))
 
     owner = relationship("User", back_populates="contacts")
\ No newline at end of file
@@ -0,0 +1,382 @@
+import logging
+from typing import Optional
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from src.db.db_models import (
+    db,
+    email_key_expression,
+    owner_shift,
+    phone_key_expression,
+)
+
+
+class Migration(BaseModel):
+    version: int
+    description: str
+    statements: list[str]
+    optional: bool = False
+    # Selects a line for every saved row the migration can't be applied to, a
+    # required migration then fails listing them and an optional one is skipped
+    conflicts: Optional[str] = None
+    # Resolves the conflicts, run on request with python -m src.db --resolve
+    resolve: list[str] = []
+
+
+class MigrationError(Exception):
+    def __init__(self, migration: Migration, conflicts: list[str]):
+        message = (
+            f"Migration {migration.version} ({migration.description}) can't be "
+            f"applied to the saved data: {'; '.join(conflicts)}."
+        )
+        if migration.resolve:
+            message += (
+                " Fix them, or run `PYTHONPATH=backend python -m src.db --resolve` "
+                "to keep the oldest contact of each clash and delete the others."
+            )
+        super().__init__(message)
+
+
+# Contacts which the case insensitive unique email index would reject
+email_key_clashes = (
+    "SELECT 'contacts ' || group_concat(id, ', ') || ' share ' || "
+    "email_key || ' ignoring case' "
+    "FROM contacts GROUP BY owner_uuid, email_key HAVING count(*) > 1"
+)
+
+def search_rowid(contact: str):
+    """The search index rowid of the contact, see db_models.owner_shift"""
+    return (
+        "((SELECT number FROM users WHERE uuid = "
+        f"{contact}.owner_uuid) << {owner_shift}) + {contact}.id"
+    )
+
+
+# Versions are consecutive, the database's PRAGMA user_version holds the last one
+# applied. Statements must be idempotent, create_all may already have made them.
+# SQLite has no ADD COLUMN IF NOT EXISTS, a column which already exists is skipped.
+# An optional migration needs a feature SQLite may be built without, or data the
+# database may not satisfy. When it conflicts or its first statement fails it is
+# skipped, the app falls back to working without it and every later upgrade tries
+# it again.
+migrations = [
+    Migration(
+        version=1,
+        description="owner scoped unique email and phone of contacts",
+        statements=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_contacts_owner_uuid_email "
+            "ON contacts (owner_uuid, email)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_contacts_owner_uuid_phone "
+            "ON contacts (owner_uuid, phone)",
+        ],
+        # The old check_unique_contact raced, concurrent writes may have saved
+        # the same email or phone twice
+        conflicts="SELECT 'contacts ' || group_concat(id, ', ') || ' share ' || email "
+        "FROM contacts GROUP BY owner_uuid, email HAVING count(*) > 1 "
+        "UNION ALL "
+        "SELECT 'contacts ' || group_concat(id, ', ') || ' share ' || phone "
+        "FROM contacts GROUP BY owner_uuid, phone HAVING count(*) > 1",
+        resolve=[
+            "DELETE FROM contacts WHERE id NOT IN "
+            "(SELECT min(id) FROM contacts GROUP BY owner_uuid, email) "
+            "RETURNING id, first_name, last_name, phone, email",
+            "DELETE FROM contacts WHERE id NOT IN "
+            "(SELECT min(id) FROM contacts GROUP BY owner_uuid, phone) "
+            "RETURNING id, first_name, last_name, phone, email",
+        ],
+    ),
+    Migration(
+        version=2,
+        description="owner scoped indexes for sorting and filtering contacts",
+        statements=[
+            "CREATE INDEX IF NOT EXISTS ix_contacts_owner_uuid "
+            "ON contacts (owner_uuid)",
+            "CREATE INDEX IF NOT EXISTS ix_contacts_owner_uuid_first_name "
+            "ON contacts (owner_uuid, first_name, id)",
+            "CREATE INDEX IF NOT EXISTS ix_contacts_owner_uuid_last_name "
+            "ON contacts (owner_uuid, last_name, id)",
+        ],
+    ),
+    Migration(
+        version=3,
+        description="FTS5 trigram index of the contacts' text fields",
+        optional=True,
+        statements=[
+            "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+            "first_name, last_name, email, phone, "
+            "content='contacts', content_rowid='id', tokenize='trigram')",
+            "CREATE TRIGGER IF NOT EXISTS contacts_fts_insert AFTER INSERT ON contacts "
+            "BEGIN "
+            "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone) "
+            "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS contacts_fts_delete AFTER DELETE ON contacts "
+            "BEGIN "
+            "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, "
+            "email, phone) "
+            "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, "
+            "old.phone); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS contacts_fts_update "
+            "AFTER UPDATE OF first_name, last_name, email, phone ON contacts "
+            "BEGIN "
+            "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, "
+            "email, phone) "
+            "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, "
+            "old.phone); "
+            "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone) "
+            "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone); "
+            "END",
+            "INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')",
+        ],
+    ),
+    Migration(
+        version=4,
+        description="per user version of the contacts, for ETags",
+        statements=[
+            "ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0",
+        ],
+    ),
+    Migration(
+        version=5,
+        description="bump the owner's data_version on every write to contacts",
+        statements=[
+            "CREATE TRIGGER IF NOT EXISTS contacts_version_insert "
+            "AFTER INSERT ON contacts "
+            "BEGIN "
+            "UPDATE users SET data_version = data_version + 1 "
+            "WHERE uuid = new.owner_uuid; "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS contacts_version_update "
+            "AFTER UPDATE ON contacts "
+            "BEGIN "
+            "UPDATE users SET data_version = data_version + 1 "
+            "WHERE uuid = new.owner_uuid; "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS contacts_version_delete "
+            "AFTER DELETE ON contacts "
+            "BEGIN "
+            "UPDATE users SET data_version = data_version + 1 "
+            "WHERE uuid = old.owner_uuid; "
+            "END",
+        ],
+    ),
+    Migration(
+        version=6,
+        description="per user count of the contacts, kept by the version triggers",
+        statements=[
+            "ALTER TABLE users ADD COLUMN contact_count INTEGER NOT NULL DEFAULT 0",
+            "DROP TRIGGER IF EXISTS contacts_version_insert",
+            "CREATE TRIGGER contacts_version_insert "
+            "AFTER INSERT ON contacts "
+            "BEGIN "
+            "UPDATE users SET data_version = data_version + 1, "
+            "contact_count = contact_count + 1 "
+            "WHERE uuid = new.owner_uuid; "
+            "END",
+            "DROP TRIGGER IF EXISTS contacts_version_delete",
+            "CREATE TRIGGER contacts_version_delete "
+            "AFTER DELETE ON contacts "
+            "BEGIN "
+            "UPDATE users SET data_version = data_version + 1, "
+            "contact_count = contact_count - 1 "
+            "WHERE uuid = old.owner_uuid; "
+            "END",
+            "UPDATE users SET contact_count = "
+            "(SELECT count(*) FROM contacts WHERE contacts.owner_uuid = users.uuid)",
+        ],
+    ),
+    Migration(
+        version=7,
+        description="normalized email and phone keys of contacts, for exact lookups",
+        statements=[
+            "ALTER TABLE contacts ADD COLUMN email_key VARCHAR NOT NULL "
+            f"GENERATED ALWAYS AS ({email_key_expression})",
+            "ALTER TABLE contacts ADD COLUMN phone_key VARCHAR NOT NULL "
+            f"GENERATED ALWAYS AS ({phone_key_expression})",
+            # The phone pattern has fixed groups, so its digits are as unique as it
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_contacts_owner_uuid_phone_key "
+            "ON contacts (owner_uuid, phone_key)",
+        ],
+    ),
+    Migration(
+        version=8,
+        description="owner scoped case insensitive unique email of contacts, "
+        "skipped when saved contacts differ only in the case of their email",
+        optional=True,
+        conflicts=email_key_clashes,
+        statements=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_contacts_owner_uuid_email_key "
+            "ON contacts (owner_uuid, email_key)",
+        ],
+    ),
+    Migration(
+        version=9,
+        description="drop the exact unique phone of contacts, its key covers it",
+        statements=["DROP INDEX IF EXISTS uq_contacts_owner_uuid_phone"],
+    ),
+    Migration(
+        version=10,
+        description="drop the exact unique email of contacts once its key covers it",
+        optional=True,
+        conflicts=email_key_clashes,
+        statements=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_contacts_owner_uuid_email_key "
+            "ON contacts (owner_uuid, email_key)",
+            "DROP INDEX IF EXISTS uq_contacts_owner_uuid_email",
+        ],
+    ),
+    Migration(
+        version=11,
+        description="small integer number of every user",
+        statements=[
+            "ALTER TABLE users ADD COLUMN number INTEGER",
+            "UPDATE users SET number = rowid WHERE number IS NULL",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_users_number ON users (number)",
+            "CREATE TRIGGER IF NOT EXISTS users_number AFTER INSERT ON users "
+            "WHEN new.number IS NULL "
+            "BEGIN "
+            "UPDATE users "
+            "SET number = (SELECT coalesce(max(number), 0) + 1 FROM users) "
+            "WHERE uuid = new.uuid; "
+            "END",
+        ],
+    ),
+    Migration(
+        version=12,
+        description="FTS5 trigram index of the contacts scoped by owner, replaces the "
+        "one of migration 3",
+        optional=True,
+        statements=[
+            # Contentless, the rowid is the owner's number shifted left 32 bits
+            # plus the contact id, so each owner's contacts are one rowid range
+            "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_search USING fts5("
+            "first_name, last_name, email, phone, content='', tokenize='trigram')",
+            "DROP TRIGGER IF EXISTS contacts_fts_insert",
+            "DROP TRIGGER IF EXISTS contacts_fts_delete",
+            "DROP TRIGGER IF EXISTS contacts_fts_update",
+            "DROP TABLE IF EXISTS contacts_fts",
+            "CREATE TRIGGER IF NOT EXISTS contacts_search_insert "
+            "AFTER INSERT ON contacts "
+            "BEGIN "
+            "INSERT INTO contacts_search(rowid, first_name, last_name, email, phone) "
+            f"VALUES ({search_rowid('new')}, new.first_name, new.last_name, "
+            "new.email, new.phone); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS contacts_search_delete "
+            "AFTER DELETE ON contacts "
+            "BEGIN "
+            "INSERT INTO contacts_search(contacts_search, rowid, first_name, "
+            "last_name, email, phone) "
+            f"VALUES ('delete', {search_rowid('old')}, old.first_name, old.last_name, "
+            "old.email, old.phone); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS contacts_search_update "
+            "AFTER UPDATE OF first_name, last_name, email, phone ON contacts "
+            "BEGIN "
+            "INSERT INTO contacts_search(contacts_search, rowid, first_name, "
+            "last_name, email, phone) "
+            f"VALUES ('delete', {search_rowid('old')}, old.first_name, old.last_name, "
+            "old.email, old.phone); "
+            "INSERT INTO contacts_search(rowid, first_name, last_name, email, phone) "
+            f"VALUES ({search_rowid('new')}, new.first_name, new.last_name, "
+            "new.email, new.phone); "
+            "END",
+            "INSERT INTO contacts_search(contacts_search) VALUES ('delete-all')",
+            "INSERT INTO contacts_search(rowid, first_name, last_name, email, phone) "
+            f"SELECT {search_rowid('contacts')}, first_name, last_name, email, phone "
+            "FROM contacts",
+        ],
+    ),
+]
+
+latest_version = migrations[-1].version
+
+
+async def get_version(connection: AsyncConnection) -> int:
+    return await connection.scalar(text("PRAGMA user_version"))
+
+
+async def get_skipped(connection: AsyncConnection) -> set[int]:
+    """Versions of the optional migrations which were skipped, user_version has
+    moved past them"""
+    await connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS skipped_migrations "
+            "(version INTEGER NOT NULL PRIMARY KEY)"
+        )
+    )
+    return set(await connection.scalars(text("SELECT version FROM skipped_migrations")))
+
+
+async def execute(connection: AsyncConnection, statement: str):
+    try:
+        await connection.execute(text(statement))
+    except OperationalError as error:
+        if "duplicate column name" not in str(error):
+            raise
+
+
+async def resolve(connection: AsyncConnection, migration: Migration):
+    for statement in migration.resolve:
+        for row in await connection.execute(text(statement)):
+            logging.warning(
+                f"Deleted contact {row.id} for migration {migration.version}: "
+                f"{row.first_name} {row.last_name}, {row.phone}, {row.email}"
+            )
+
+
+async def apply(
+    connection: AsyncConnection, migration: Migration, resolve_conflicts: bool
+) -> bool:
+    """Returns False when an optional migration was skipped"""
+    if migration.conflicts:
+        conflicts = list(await connection.scalars(text(migration.conflicts)))
+        if conflicts and migration.optional:
+            logging.warning(
+                f"Skipped migration {migration.version}: {'; '.join(conflicts)}"
+            )
+            return False
+        if conflicts and not resolve_conflicts:
+            raise MigrationError(migration, conflicts)
+        if conflicts:
+            await resolve(connection, migration)
+    statements = iter(migration.statements)
+    try:
+        await execute(connection, next(statements))
+    except (OperationalError, IntegrityError) as error:
+        if not migration.optional:
+            raise
+        logging.warning(f"Skipped migration {migration.version}: {error}")
+        return False
+    for statement in statements:
+        await execute(connection, statement)
+    return True
+
+
+async def upgrade(target: int = latest_version, resolve_conflicts: bool = False):
+    """Applies every migration newer than the database and retries the skipped
+    ones, up to target. Raises MigrationError when the saved data blocks one,
+    unless resolve_conflicts."""
+    async with db.get_engine().begin() as connection:
+        current = await get_version(connection)
+        skipped = await get_skipped(connection)
+        for migration in migrations:
+            version = migration.version
+            if version > target or (version <= current and version not in skipped):
+                continue
+            applied = await apply(connection, migration, resolve_conflicts)
+            if applied and version in skipped:
+                await connection.execute(
+                    text("DELETE FROM skipped_migrations WHERE version = :version"),
+                    {"version": version},
+                )
+            elif not applied and version not in skipped:
+                await connection.execute(
+                    text("INSERT INTO skipped_migrations (version) VALUES (:version)"),
+                    {"version": version},
+                )
+            if version > current:
+                await connection.execute(text(f"PRAGMA user_version = {version}"))
+        return await get_version(connection)
@@ -0,0 +1,90 @@
+from collections import Counter
+from contextlib import contextmanager
+import re
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.db import writer
+from src.db.db_models import db, reader_engine
+
+# Counts the SQL statements run within a block, for asserting query budgets in
+# tests and benchmarks. Statements of the same shape repeated within the block
+# are reported as probable N+1 queries.
+
+transaction_control = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA")
+
+
+def statement_shape(statement: str):
+    """The statement with whitespace normalized and placeholder lists collapsed,
+    so that the same query with a different number of parameters or rows matches"""
+    shape = re.sub(r"\s+", " ", statement).strip()
+    shape = re.sub(r"\?(?: ?, ?\?)+", "?...", shape)
+    return re.sub(r"(\([^()]*\))(?:, \1)+", r"\1...", shape)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryLog:
+    def __init__(self, include_transaction_control: bool = False):
+        self.include_transaction_control = include_transaction_control
+        self.statements: list[str] = []
+        self.commits = 0
+
+    def record(self, statement: str):
+        keyword = statement.lstrip()[:9].upper()
+        if self.include_transaction_control or not keyword.startswith(
+            transaction_control
+        ):
+            self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, min_count: int = 2) -> dict[str, int]:
+        """Shapes run at least min_count times, the likely N+1 patterns"""
+        shapes = Counter(statement_shape(statement) for statement in self.statements)
+        return {shape: count for shape, count in shapes.items() if count >= min_count}
+
+    def check(self, budget: Optional[int] = None, max_repeats: int = 1):
+        """Raises QueryBudgetExceeded if more than budget statements ran, or if a
+        statement shape ran more than max_repeats times"""
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f"{self.count} statements ran, the budget is {budget}")
+        for shape, count in self.repeated(min_count=max_repeats + 1).items():
+            problems.append(f"probable N+1, {count} times: {shape}")
+        if problems:
+            listing = "\n".join(f"  {statement}" for statement in self.statements)
+            raise QueryBudgetExceeded("\n".join(problems) + "\nStatements:\n" + listing)
+
+
+@contextmanager
+def count_queries(*engines: AsyncEngine, include_transaction_control: bool = False):
+    """Records the statements and commits of the engines while the block runs, by
+    default the primary, reader and write queue engines. Wrap one request to count
+    the statements of that request."""
+    if not engines:
+        engines = (db.get_engine(), reader_engine)
+        if writer.queue is not None:
+            engines += (writer.queue.engine,)
+    log = QueryLog(include_transaction_control=include_transaction_control)
+
+    def on_execute(_connection, _cursor, statement, _parameters, _context, _many):
+        log.record(statement)
+
+    def on_commit(_connection):
+        # Commits go through the DBAPI connection, not a statement
+        log.commits += 1
+
+    for engine in engines:
+        event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+        event.listen(engine.sync_engine, "commit", on_commit)
+    try:
+        yield log
+    finally:
+        for engine in engines:
+            event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+            event.remove(engine.sync_engine, "commit", on_commit)
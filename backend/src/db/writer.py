@@ -0,0 +1,146 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from src import config, metrics
+from src.db.db_models import db, set_pragmas
+
+# A unit of write work. It may read and flush, but must not commit, and must return
+# plain data since its session may be another request's or the writer's.
+type Work[T] = Callable[[AsyncSession], Awaitable[T]]
+
+
+class WriteQueue:
+    """Runs every submitted work on one task. Works which queue up while a batch is
+    committing share the next transaction (group commit), each inside a SAVEPOINT
+    so that a failing work only rolls back itself."""
+
+    def __init__(self, max_batch_size: int):
+        self.max_batch_size = max_batch_size
+        self.engine = create_engine()
+        self.jobs: asyncio.Queue[Optional[tuple[Work, asyncio.Future]]] = (
+            asyncio.Queue()
+        )
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Commits the queued works and stops the task"""
+        await self.jobs.put(None)
+        await self.task
+        await self.engine.dispose()
+
+    async def submit[T](self, work: Work[T]) -> T:
+        """Resolves once the batch of the work is committed"""
+        future = asyncio.get_running_loop().create_future()
+        await self.jobs.put((work, future))
+        return await future
+
+    async def run(self):
+        stopping = False
+        while not stopping:
+            job = await self.jobs.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < self.max_batch_size and not self.jobs.empty():
+                job = self.jobs.get_nowait()
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            await self.commit(batch)
+
+    async def commit(self, batch: list[tuple[Work, asyncio.Future]]):
+        outcomes = []
+        try:
+            async with AsyncSession(self.engine, expire_on_commit=False) as session:
+                for work, future in batch:
+                    if future.cancelled():
+                        continue
+                    try:
+                        async with session.begin_nested():
+                            outcomes.append((future, await work(session), None))
+                    except Exception as error:
+                        outcomes.append((future, None, error))
+                await session.commit()
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def create_engine() -> AsyncEngine:
+    """The writer's own engine. pysqlite begins transactions implicitly and only
+    before DML, which breaks SAVEPOINTs, so here that is turned off and BEGIN is
+    emitted explicitly. The request sessions keep the default, which doesn't hold
+    a read lock between statements and so never blocks the writer's commit."""
+    engine = create_async_engine(
+        db.get_engine().url, poolclass=AsyncAdaptedQueuePool, pool_size=1
+    )
+    event.listen(engine.sync_engine, "connect", set_pragmas)
+    metrics.instrument(engine, "writer")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, _connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def on_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    return engine
+
+
+queue: Optional[WriteQueue] = None
+
+
+def start():
+    global queue
+    if config.write_queue_enabled:
+        queue = WriteQueue(max_batch_size=config.write_queue_max_batch_size)
+        queue.start()
+
+
+async def stop():
+    global queue
+    if queue is not None:
+        await queue.stop()
+        queue = None
+
+
+async def write[T](session: AsyncSession, work: Work[T]) -> T:
+    """Runs the work and commits it, on the writer task when the write queue is
+    enabled, otherwise on the request's session"""
+    if queue is not None:
+        return await queue.submit(work)
+    try:
+        result = await work(session)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    return result
+
+
+async def write_checked[T](session: AsyncSession, work: Work[T]) -> T:
+    """Writes a work which checks for conflicts before writing. A concurrent write
+    may take a value between the check and the write, so an IntegrityError runs
+    the work once more, and its check then finds the value."""
+    try:
+        return await write(session, work)
+    except IntegrityError:
+        return await write(session, work)
@@ -1,11 +1,13 @@
+import time
 from typing import Annotated, Literal
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException
 from src.auth import token_manager
-from src.db.db_models import db
+from src.db.db_models import db, ReadSession
 from src.exceptions import InactiveUserException, InvalidTokenException
-from src.auth import user_service
+from src.auth import user_service, auth_cache
+from src import metrics
 from fastapi import status
 
 
@@ -15,6 +17,12 @@ async def get_session():
         yield session
 
 
+async def get_read_session():
+    """Get session dependency for read-only paths, on the reader pool"""
+    async with ReadSession() as session:
+        yield session
+
+
 def chosen_bearer(scope: Literal["security", "access"]):
     match (scope):
         case "access":
@@ -26,18 +34,28 @@ def chosen_bearer(scope: Literal["security", "access"]):
 def get_current_active_user(scope: Literal["security", "access"]):
 
     async def wrapper(
-        session: Annotated[AsyncSession, Depends(get_session)],
+        session: Annotated[AsyncSession, Depends(get_read_session)],
         result: Annotated[
             token_manager.TokenBearerResult, Depends(chosen_bearer(scope))
         ],
     ):
         """Get current user dependency, raises error 403 if access is forbidden"""
+        start = time.perf_counter()
         try:
             uuid = UUID(result.payload.sub)
         except ValueError:
             raise InvalidTokenException
 
-        user = await user_service.get_user_by_uuid(session=session, uuid=uuid)
+        cached_user = auth_cache.get(uuid=uuid, token=result.token)
+        if cached_user is not None:
+            user = await session.merge(cached_user, load=False)
+        else:
+            read_generation = auth_cache.generation(uuid)
+            user = await user_service.get_user_by_uuid(session=session, uuid=uuid)
+        metrics.auth_duration.observe(
+            time.perf_counter() - start,
+            cache="miss" if cached_user is None else "hit",
+        )
         if not user:
             raise InvalidTokenException
         elif scope == "access" and result.token != user.access_token:
@@ -50,6 +68,13 @@ def get_current_active_user(scope: Literal["security", "access"]):
             )
         elif user.disabled:
             raise InactiveUserException
+        if cached_user is None:
+            auth_cache.put(
+                uuid=uuid,
+                token=result.token,
+                user=user,
+                read_generation=read_generation,
+            )
         return user
 
     return wrapper
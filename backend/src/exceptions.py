@@ -80,6 +80,20 @@ class InvalidTokenException(HTTPException):
         headers: None = None
 
 
+class InvalidCursorException(HTTPException):
+    def __init__(
+        self,
+    ) -> None:
+        super().__init__(
+            status_code=400,
+            detail="Invalid cursor for the requested sort",
+        )
+
+    class Model(ErrorResponse):
+        detail: str = "Invalid cursor for the requested sort"
+        headers: None = None
+
+
 class InactiveUserException(HTTPException):
     def __init__(self, status_code: int = 403) -> None:
         super().__init__(status_code=status_code, detail="Inactive user")
@@ -89,8 +103,30 @@ class InactiveUserException(HTTPException):
         headers: None = None
 
 
+class NotModifiedException(HTTPException):
+    def __init__(self, etag: str) -> None:
+        super().__init__(status_code=304, headers={"ETag": etag})
+
+
+class ServiceBusyException(HTTPException):
+    def __init__(self, retry_after: int = 1) -> None:
+        super().__init__(
+            status_code=503,
+            detail="Server is busy, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    class Model(ErrorResponse):
+        detail: str = "Server is busy, try again later"
+        headers: dict[str, str] = {"Retry-After": "1"}
+
+
 def unique_exception(error: IntegrityError, instance: BaseModel, table_name: str):
     msg = str(error.args[0])
-    field = msg[msg.index(f"{table_name}.") + len(table_name) + 1 :]
+    # Composite constraints list the owner column first, the last one clashed
+    column = msg.split(", ")[-1]
+    field = column[column.index(f"{table_name}.") + len(table_name) + 1 :]
+    # A normalized key column clashes on behalf of the field it's generated from
+    field = field.removesuffix("_key")
     value = getattr(instance, field)
     return UniqueException(field=field, value=value)
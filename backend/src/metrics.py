@@ -0,0 +1,195 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+import time
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# In-process metrics in the Prometheus text format, served on /metrics. Values
+# are per process, every worker has its own.
+
+latency_buckets = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+count_buckets = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def format_labels(labels: dict[str, str]):
+    if not labels:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in labels.values()
+    )
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = latency_buckets,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> (count per bucket, sum, count)
+        self.series: dict[tuple[str, ...], list] = {}
+        registry.append(self)
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(labels[name] for name in self.labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for key, (bucket_counts, total, count) in sorted(self.series.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(labels | {"le": str(bucket)})
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_bucket{format_labels(labels | {'le': '+Inf'})} {count}"
+            yield f"{self.name}_sum{format_labels(labels)} {total}"
+            yield f"{self.name}_count{format_labels(labels)} {count}"
+
+
+registry: list[Histogram] = []
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Latency of the requests, until the last byte of the response is sent",
+    labels=("method", "route", "status"),
+)
+request_queries = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed on behalf of a request",
+    labels=("method", "route"),
+    buckets=count_buckets,
+)
+request_sql_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Time a request spent executing SQL",
+    labels=("method", "route"),
+)
+query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Latency of the SQL statements, per engine",
+    labels=("engine",),
+)
+auth_duration = Histogram(
+    "auth_dependency_duration_seconds",
+    "Time spent authenticating a request's token and loading its user",
+    labels=("cache",),
+)
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent hashing or verifying a password on the hashing pool",
+    labels=("operation",),
+)
+password_hash_wait = Histogram(
+    "password_hash_wait_seconds",
+    "Time waiting for a free hashing worker",
+    labels=("operation",),
+)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+# Statements run by the writer task aren't attributed to the waiting request
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None
+)
+
+
+def instrument(engine: AsyncEngine, name: str):
+    """Times every statement of the engine, and counts it for the current request"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_execute(connection, _cursor, _statement, _parameters, _context, _many):
+        connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_execute(connection, _cursor, _statement, _parameters, _context, _many):
+        elapsed = time.perf_counter() - connection.info["query_start"].pop()
+        query_duration.observe(elapsed, engine=name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_seconds += elapsed
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def on_error(context):
+        if context.connection is not None:
+            starts = context.connection.info.get("query_start")
+            if starts:
+                starts.pop()
+
+
+class MetricsMiddleware:
+    """Records the latency, SQL statements and SQL time of every request, labeled
+    with the matched route's path template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            # Unmatched paths share one label, so that scans don't add series
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            request_duration.observe(
+                elapsed, method=method, route=path, status=str(status_code)
+            )
+            request_queries.observe(stats.queries, method=method, route=path)
+            request_sql_duration.observe(stats.sql_seconds, method=method, route=path)
+
+
+def render():
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,44 @@
+import os
+import tempfile
+from uuid import uuid4
+import pytest
+
+# The database is configured on import, so the tests point it at a temporary file
+# before anything imports src
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/tests.db"
+
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+    from src import app
+
+    with TestClient(app, base_url="http://localhost") as client:
+        yield client
+
+
+def log_in_new_user(client) -> dict:
+    """Registers and logs in a new user, returns its Authorization header"""
+    from src.config import prefix
+
+    user = {
+        "display_name": "tester",
+        "email": f"{uuid4().hex}@example.com",
+        "password": "secret1",
+    }
+    client.post(f"{prefix}/users/register", json=user)
+    credentials = {"username": user["email"], "password": user["password"]}
+    tokens = client.post(f"{prefix}/users/login", data=credentials).json()
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+@pytest.fixture(scope="module")
+def auth(client):
+    """A user for the module"""
+    return log_in_new_user(client)
+
+
+@pytest.fixture(scope="module")
+def other_auth(client):
+    """A second user for the module, to check what users share"""
+    return log_in_new_user(client)
@@ -0,0 +1,81 @@
+from fastapi.testclient import TestClient
+from src.config import prefix
+
+
+def contact(number: int):
+    return {
+        "first_name": "Tagged",
+        "last_name": "Cache",
+        "phone": f"+1-555-300-{number:03d}",
+        "email": f"tagged{number}@example.com",
+    }
+
+
+def etag(client: TestClient, auth: dict) -> str:
+    response = client.get(f"{prefix}/contacts", headers=auth)
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_matching_etag_is_not_modified(client: TestClient, auth: dict):
+    client.post(f"{prefix}/contacts", json=contact(0), headers=auth)
+    tag = etag(client, auth)
+
+    response = client.get(
+        f"{prefix}/contacts", headers=auth | {"If-None-Match": f'W/"other", {tag}'}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == tag
+    assert response.content == b""
+
+    # The ETag is per URL
+    response = client.get(
+        f"{prefix}/contacts", params={"limit": 5}, headers=auth | {"If-None-Match": tag}
+    )
+    assert response.status_code == 200
+
+
+def test_every_write_changes_the_etag(
+    client: TestClient, auth: dict, other_auth: dict
+):
+    # The data version is bumped by triggers which only the migrations create
+    tags = [etag(client, auth)]
+    other_tag = etag(client, other_auth)
+
+    contact_id = client.post(
+        f"{prefix}/contacts", json=contact(1), headers=auth
+    ).json()["id"]
+    tags.append(etag(client, auth))
+
+    client.post(f"{prefix}/contacts/batch", json=[contact(2)], headers=auth)
+    tags.append(etag(client, auth))
+
+    csv_file = (
+        b"first_name,last_name,phone,email\r\n"
+        b"Tagged,Import,+1-555-300-003,tagged3@example.com\r\n"
+    )
+    client.post(
+        f"{prefix}/contacts/import",
+        files={"file": ("contacts.csv", csv_file, "text/csv")},
+        headers=auth,
+    )
+    tags.append(etag(client, auth))
+
+    client.patch(
+        f"{prefix}/contacts/{contact_id}", json={"first_name": "Edited"}, headers=auth
+    )
+    tags.append(etag(client, auth))
+
+    client.patch(
+        f"{prefix}/contacts/batch",
+        json=[{"id": contact_id, "contact": {"last_name": "Batched"}}],
+        headers=auth,
+    )
+    tags.append(etag(client, auth))
+
+    client.delete(f"{prefix}/contacts/{contact_id}", headers=auth)
+    tags.append(etag(client, auth))
+
+    assert len(set(tags)) == len(tags)
+    # Another user's writes don't invalidate the user's cache
+    assert etag(client, other_auth) == other_tag
@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+from src import config
+from src.config import prefix
+
+
+def csv_file(rows: list[bytes]):
+    return b"first_name,last_name,phone,email\r\n" + b"".join(
+        row + b"\r\n" for row in rows
+    )
+
+
+def last_name(number: int):
+    return "Row" + "abcdefghi"[number - 1]
+
+
+def contact_row(number: int):
+    return (
+        f"Importer,{last_name(number)},+1-555-100-{number:03d},"
+        f"importer{number}@example.com"
+    ).encode()
+
+
+def test_unreadable_row_stops_the_import_after_the_committed_rows(
+    client: TestClient, auth: dict, monkeypatch: pytest.MonkeyPatch
+):
+    # Three chunks are committed before the bad byte, and one row of its chunk
+    monkeypatch.setattr(config, "import_chunk_size", 2)
+    rows = [contact_row(number) for number in range(1, 8)]
+    rows.insert(7, b"Broken,Row\xff,+1-555-100-999,broken@example.com")
+    rows.append(contact_row(9))
+
+    response = client.post(
+        f"{prefix}/contacts/import",
+        files={"file": ("contacts.csv", csv_file(rows), "text/csv")},
+        headers=auth,
+    )
+
+    assert response.status_code == 200
+    report = response.json()
+    assert report["rows"] == 8
+    assert report["created"] == 7
+    assert report["failed"] == 1
+    [error] = report["errors"]
+    assert error["row"] == 8 and error["fatal"]
+
+    listed = client.get(
+        f"{prefix}/contacts", params={"limit": 100}, headers=auth
+    ).json()["contacts"]
+    assert sorted(contact["last_name"] for contact in listed) == [
+        last_name(number) for number in range(1, 8)
+    ]
+
+
+def test_unreadable_first_row_is_rejected(client: TestClient, auth: dict):
+    response = client.post(
+        f"{prefix}/contacts/import",
+        files={"file": ("contacts.csv", b"first_name\xff\r\n", "text/csv")},
+        headers=auth,
+    )
+    assert response.status_code == 400
@@ -0,0 +1,167 @@
+import os
+from pathlib import Path
+import sqlite3
+import subprocess
+import sys
+from uuid import uuid4
+import pytest
+from fastapi.testclient import TestClient
+from src.config import prefix
+
+backend = Path(__file__).parents[1]
+
+# The schema of the first release, before any migration
+legacy_schema = """
+CREATE TABLE users (
+    uuid CHAR(32) NOT NULL PRIMARY KEY,
+    email VARCHAR NOT NULL UNIQUE,
+    display_name VARCHAR NOT NULL,
+    hashed_password VARCHAR NOT NULL,
+    disabled BOOLEAN NOT NULL,
+    access_token VARCHAR NOT NULL,
+    refresh_token VARCHAR NOT NULL,
+    security_token VARCHAR NOT NULL,
+    is_logged_in BOOLEAN NOT NULL
+);
+CREATE TABLE contacts (
+    id INTEGER NOT NULL PRIMARY KEY,
+    first_name VARCHAR NOT NULL,
+    last_name VARCHAR NOT NULL,
+    phone VARCHAR NOT NULL,
+    email VARCHAR NOT NULL,
+    owner_uuid CHAR(32) NOT NULL REFERENCES users (uuid)
+);
+"""
+
+
+def legacy_database(path: Path, contacts: list[tuple[str, str]]):
+    """A database of the first release with one user owning the (email, phone)
+    contacts, their ids follow the list"""
+    with sqlite3.connect(path) as connection:
+        connection.executescript(legacy_schema)
+        owner = uuid4().hex
+        connection.execute(
+            "INSERT INTO users VALUES (?, 'owner@example.com', 'owner', '', 0, '', "
+            "'', '', 0)",
+            (owner,),
+        )
+        connection.executemany(
+            "INSERT INTO contacts (first_name, last_name, phone, email, owner_uuid) "
+            "VALUES ('Legacy', 'Contact', ?, ?, ?)",
+            [(phone, email, owner) for email, phone in contacts],
+        )
+    connection.close()
+    return path
+
+
+def migrate(path: Path, *args: str):
+    """Runs python -m src.db against the database"""
+    return subprocess.run(
+        [sys.executable, "-m", "src.db", *args],
+        cwd=backend,
+        env=os.environ | {"DATABASE_URL": f"sqlite:///{path}"},
+        capture_output=True,
+        text=True,
+    )
+
+
+def query(path: Path, statement: str, *params):
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute(statement, params).fetchall()
+    connection.close()
+    return rows
+
+
+def index_names(path: Path):
+    return {name for (name,) in query(path, "SELECT name FROM sqlite_master")}
+
+
+def test_case_clashing_emails_skip_the_email_key_index_until_fixed(tmp_path: Path):
+    path = legacy_database(
+        tmp_path / "legacy.db",
+        [("Ann@example.com", "+1-555-555-001"), ("ann@example.com", "+1-555-555-002")],
+    )
+    assert migrate(path).returncode == 0
+
+    status = migrate(path, "--status").stdout
+    assert "skipped migrations 8, 10" in status
+    names = index_names(path)
+    assert "uq_contacts_owner_uuid_email_key" not in names
+    # The exact email index stays while its key can't replace it
+    assert "uq_contacts_owner_uuid_email" in names
+
+    query(path, "UPDATE contacts SET email = 'ann2@example.com' WHERE id = 2")
+    assert migrate(path).returncode == 0
+
+    assert "skipped" not in migrate(path, "--status").stdout
+    names = index_names(path)
+    assert "uq_contacts_owner_uuid_email_key" in names
+    assert "uq_contacts_owner_uuid_email" not in names
+
+
+def test_duplicates_block_migration_1_until_resolved(tmp_path: Path):
+    path = legacy_database(
+        tmp_path / "legacy.db",
+        [
+            ("ann@example.com", "+1-555-555-001"),
+            ("ann@example.com", "+1-555-555-002"),
+            ("bob@example.com", "+1-555-555-002"),
+            ("cid@example.com", "+1-555-555-003"),
+        ],
+    )
+    failed = migrate(path)
+    assert failed.returncode != 0
+    assert "Migration 1" in failed.stderr
+    assert "contacts 1, 2 share ann@example.com" in failed.stderr
+    assert "contacts 2, 3 share +1-555-555-002" in failed.stderr
+    assert query(path, "PRAGMA user_version") == [(0,)]
+
+    assert migrate(path, "--resolve").returncode == 0
+    # The oldest contact of each clash is kept, deleting 2 for its email also
+    # ends its phone clash with 3
+    assert query(path, "SELECT id FROM contacts ORDER BY id") == [(1,), (3,), (4,)]
+    assert "database version 12" in migrate(path, "--status").stdout
+
+
+@pytest.fixture
+def email_key_clash(client: TestClient, auth: dict):
+    """Two of the user's contacts whose emails differ only in case, as saved
+    where migration 8 was skipped"""
+    path = os.environ["DATABASE_URL"].removeprefix("sqlite:///")
+    contact = {
+        "first_name": "Clash",
+        "last_name": "Case",
+        "phone": "+1-555-600-001",
+        "email": "Clash@example.com",
+    }
+    first = client.post(f"{prefix}/contacts", json=contact, headers=auth).json()["id"]
+    query(path, "DROP INDEX uq_contacts_owner_uuid_email_key")
+    query(
+        path,
+        "INSERT INTO contacts (first_name, last_name, phone, email, owner_uuid) "
+        "SELECT first_name, last_name, '+1-555-600-002', lower(email), owner_uuid "
+        "FROM contacts WHERE id = ?",
+        first,
+    )
+    try:
+        yield first
+    finally:
+        query(path, "DELETE FROM contacts WHERE email = 'clash@example.com'")
+        query(
+            path,
+            "CREATE UNIQUE INDEX uq_contacts_owner_uuid_email_key "
+            "ON contacts (owner_uuid, email_key)",
+        )
+
+
+def test_batch_edit_of_a_contact_sharing_an_email_key(
+    client: TestClient, auth: dict, email_key_clash: int
+):
+    # Resending the unchanged email loads the other contact holding its key
+    changes = {"last_name": "Edited", "email": "Clash@example.com"}
+    edits = [{"id": email_key_clash, "contact": changes}]
+    response = client.patch(f"{prefix}/contacts/batch", json=edits, headers=auth)
+    assert response.status_code == 200
+    [result] = response.json()["results"]
+    assert result["status"] == "updated"
+    assert result["contact"]["last_name"] == "Edited"
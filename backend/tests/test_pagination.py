@@ -0,0 +1,65 @@
+import base64
+import json
+import pytest
+from fastapi.testclient import TestClient
+from src.config import prefix
+
+fields = ["id", "first_name", "last_name", "phone", "email"]
+
+
+@pytest.fixture(scope="module")
+def contacts(client: TestClient, auth: dict):
+    # Repeated names, so the id tiebreaker decides part of the order
+    batch = [
+        {
+            "first_name": ["Ann", "bob", "Cid"][number % 3],
+            "last_name": ["Lee", "Kim"][number % 2],
+            "phone": f"+{[1, 44, 972][number % 3]}-555-{number:03d}-{number % 7:03d}",
+            "email": f"{['Zed', 'amy', 'Bo'][number % 3]}{number}@example.com",
+        }
+        for number in range(47)
+    ]
+    response = client.post(f"{prefix}/contacts/batch", json=batch, headers=auth)
+    assert response.json()["created"] == len(batch)
+
+
+@pytest.mark.usefixtures("contacts")
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("field", fields)
+def test_cursor_pages_match_offset_pages(
+    client: TestClient, auth: dict, field: str, order: str
+):
+    sort = {"sort_field": field, "sort_order": order, "page_size": 10}
+    offset_ids = []
+    for page in range(5):
+        response = client.get(
+            f"{prefix}/contacts", params=sort | {"page": page}, headers=auth
+        )
+        offset_ids += [contact["id"] for contact in response.json()["contacts"]]
+
+    cursor_ids, cursor = [], None
+    while True:
+        params = sort | {"page": 0} | ({"cursor": cursor} if cursor else {})
+        page = client.get(f"{prefix}/contacts", params=params, headers=auth).json()
+        cursor_ids += [contact["id"] for contact in page["contacts"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(offset_ids) == 47
+    assert cursor_ids == offset_ids
+
+
+@pytest.mark.parametrize("value", [{"a": 1}, [1, 2], None, 1.5, True])
+def test_cursor_with_a_crafted_value_is_rejected(
+    client: TestClient, auth: dict, value
+):
+    cursor = {"field": "last_name", "order": "asc", "value": value, "id": 1}
+    encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+    response = client.get(
+        f"{prefix}/contacts",
+        params={"sort_field": "last_name", "page": 0, "page_size": 1}
+        | {"cursor": encoded},
+        headers=auth,
+    )
+    assert response.status_code == 400
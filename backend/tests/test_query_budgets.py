@@ -0,0 +1,21 @@
+import pytest
+from fastapi.testclient import TestClient
+from httpx import Response
+from benchmarks.routes import call_routes
+from src.db.query_counter import QueryBudgetExceeded, QueryLog
+
+# Fails when a route runs more SQL statements than its budget or repeats a
+# statement shape, benchmarks.query_budgets prints the same checks
+
+
+def test_query_budgets(client: TestClient):
+    def report(
+        name: str, budget: int, expected: int, response: Response, log: QueryLog
+    ):
+        assert response.status_code == expected, f"{name}: {response.text}"
+        try:
+            log.check(budget=budget)
+        except QueryBudgetExceeded as error:
+            pytest.fail(f"{name}: {error}")
+
+    call_routes(client, report)
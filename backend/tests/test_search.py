@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+from src.config import prefix
+from src.contacts import search
+
+
+def find(client: TestClient, auth: dict, field: str, operator: str, value: str):
+    params = {"filter_field": field, "filter_operator": operator}
+    response = client.get(
+        f"{prefix}/contacts", params=params | {"filter_values": [value]}, headers=auth
+    )
+    return [contact["id"] for contact in response.json()["contacts"]]
+
+
+def test_text_filters_search_only_the_owners_contacts(
+    client: TestClient, auth: dict, other_auth: dict
+):
+    assert search.enabled
+    contact = {
+        "first_name": "Searchable",
+        "last_name": "Fieldhouse",
+        "phone": "+1-555-777-000",
+        "email": "searchable@example.com",
+    }
+    own_id = client.post(f"{prefix}/contacts", json=contact, headers=auth).json()["id"]
+    client.post(f"{prefix}/contacts", json=contact, headers=other_auth)
+
+    assert find(client, auth, "last_name", "contains", "ldhou") == [own_id]
+    assert find(client, auth, "first_name", "starts_with", "Search") == [own_id]
+
+    # The index follows edits and deletes
+    client.patch(
+        f"{prefix}/contacts/{own_id}", json={"last_name": "Greenhouse"}, headers=auth
+    )
+    assert find(client, auth, "last_name", "contains", "ldhou") == []
+    assert find(client, auth, "last_name", "contains", "eenhou") == [own_id]
+    client.delete(f"{prefix}/contacts/{own_id}", headers=auth)
+    assert find(client, auth, "last_name", "contains", "eenhou") == []
+    assert len(find(client, other_auth, "last_name", "contains", "ldhou")) == 1
@@ -0,0 +1,102 @@
+from uuid import uuid4
+from fastapi.testclient import TestClient
+from src.config import prefix
+from src.db.query_counter import count_queries
+
+# Every write endpoint runs its write as one statement, with RETURNING instead of
+# a refresh, in one commit. The endpoints which run two statements first read
+# what the write depends on: the password hash of a login, or the saved contacts
+# a batch or an import could clash with.
+
+
+def test_each_write_endpoint_runs_its_statements_in_one_commit(client: TestClient):
+    def write(
+        name: str, statements: int, method: str, path: str, expected=200, **kwargs
+    ):
+        with count_queries() as log:
+            response = client.request(method, f"{prefix}{path}", **kwargs)
+        assert response.status_code == expected, f"{name}: {response.text}"
+        assert (log.count, log.commits) == (statements, 1), (
+            f"{name}: {log.count} statements in {log.commits} commits\n"
+            + "\n".join(log.statements)
+        )
+        return response
+
+    def contact(number: int):
+        return {
+            "first_name": "Single",
+            "last_name": "Write",
+            "phone": f"+1-555-400-{number:03d}",
+            "email": f"single{number}@example.com",
+        }
+
+    user = {"display_name": "writer", "email": f"{uuid4().hex}@example.com"}
+    user["password"] = "secret1"
+    write("register", 1, "POST", "/users/register", json=user)
+    credentials = {"username": user["email"], "password": user["password"]}
+    tokens = write("login", 2, "POST", "/users/login", data=credentials).json()
+    auth = {"Authorization": f"Bearer {tokens['access_token']}"}
+    # Warms the auth cache, so that the writes below don't load the user
+    client.get(f"{prefix}/users/me", headers=auth)
+
+    contact_id = write(
+        "create", 1, "POST", "/contacts", json=contact(0), headers=auth
+    ).json()["id"]
+    results = write(
+        "batch create",
+        2,
+        "POST",
+        "/contacts/batch",
+        json=[contact(number) for number in range(1, 6)],
+        headers=auth,
+    ).json()["results"]
+    ids = [result["contact"]["id"] for result in results]
+    write(
+        "edit",
+        1,
+        "PATCH",
+        f"/contacts/{contact_id}",
+        json={"first_name": "Edited"},
+        headers=auth,
+    )
+    write(
+        "batch edit",
+        2,
+        "PATCH",
+        "/contacts/batch",
+        json=[{"id": id, "contact": {"last_name": "Batched"}} for id in ids],
+        headers=auth,
+    )
+    write(
+        "import",
+        2,
+        "POST",
+        "/contacts/import",
+        files={
+            "file": (
+                "contacts.csv",
+                "first_name,last_name,phone,email\n"
+                "Single,Import,+1-555-400-100,single100@example.com\n",
+                "text/csv",
+            )
+        },
+        headers=auth,
+    )
+    write("delete", 1, "DELETE", f"/contacts/{contact_id}", headers=auth)
+    write("delete many", 1, "DELETE", "/contacts", params={"ids": ids}, headers=auth)
+
+    write(
+        "security token",
+        1,
+        "POST",
+        "/users/security-token",
+        json={"password": user["password"]},
+        headers=auth,
+    )
+    write(
+        "refresh token",
+        1,
+        "GET",
+        "/users/refresh-token",
+        headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+    )